@@ -0,0 +1,23 @@
+import logging
+
+from django.db import transaction
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+CONTENT_INVALIDATION_CHANNEL = "content:invalidate"
+
+BOT_TEXTS = "bot_texts"
+SITE_SETTINGS = "site_settings"
+TARIFFS = "tariffs"
+VPN_SERVERS = "vpn_servers"
+
+
+def publish_content_change(name: str):
+    def publish():
+        try:
+            get_redis_connection("default").publish(CONTENT_INVALIDATION_CHANNEL, name)
+        except Exception as e:
+            logger.error(f"Не удалось опубликовать изменение {name}: {e}")
+
+    transaction.on_commit(publish)
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import BOT_TEXTS, SITE_SETTINGS, publish_content_change
+from .models import BotTexts, SiteSettings
+
+
+@receiver([post_save, post_delete], sender=BotTexts)
+def bot_texts_changed(**kwargs):
+    publish_content_change(BOT_TEXTS)
+
+
+@receiver([post_save, post_delete], sender=SiteSettings)
+def site_settings_changed(**kwargs):
+    publish_content_change(SITE_SETTINGS)
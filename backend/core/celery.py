@@ -1,6 +1,7 @@
 import os
 
 from celery import Celery
+from celery.signals import worker_process_shutdown
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.core.settings")
 
@@ -9,3 +10,10 @@ app = Celery("kedo-vpn")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 
 app.autodiscover_tasks()
+
+
+@worker_process_shutdown.connect
+def stop_telegram_runtime(**kwargs):
+    from backend.core.telegram import telegram_runtime
+
+    telegram_runtime.stop()
@@ -28,6 +28,7 @@ INSTALLED_APPS = [
     "backend.content.apps.ContentConfig",
     "backend.sender.apps.SenderConfig",
     "backend.dashboard.apps.DashboardConfig",
+    "backend.outbox.apps.OutboxConfig",
 ]
 
 MIDDLEWARE = [
@@ -119,6 +120,40 @@ XUI_SETTINGS = {
     "password": os.getenv("XUI_PASSWORD"),
     "inbound_id": int(os.getenv("XUI_INBOUND_ID", "1")),
 }
+XUI_SESSION_TTL_SECONDS = int(os.getenv("XUI_SESSION_TTL_SECONDS", "3000"))
+XUI_INBOUND_LOCK_TIMEOUT_SECONDS = 60
+VPN_RECONCILE_BATCH_SIZE = 500
+VPN_RECONCILE_LOCK_TIMEOUT_SECONDS = 300
+VPN_BATCH_WINDOW_SECONDS = int(os.getenv("VPN_BATCH_WINDOW_SECONDS", "5"))
+VPN_FLUSH_RETRY_SECONDS = int(os.getenv("VPN_FLUSH_RETRY_SECONDS", "60"))
+EXPIRY_SWEEP_CHUNK_SIZE = 500
+NOTIFICATION_BATCH_SIZE = 200
+
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+BROADCAST_RATE_PER_SECOND = float(os.getenv("BROADCAST_RATE_PER_SECOND", "25"))
+BROADCAST_PER_CHAT_INTERVAL_SECONDS = 1.0
+BROADCAST_MAX_RETRIES = 3
+BROADCAST_PROGRESS_LOG_SECONDS = 10
+BROADCAST_RECIPIENTS_BATCH_SIZE = 1000
+BROADCAST_SAVE_BATCH_SIZE = 500
+BROADCAST_SAVE_INTERVAL_SECONDS = 5
+BROADCAST_SHARD_SIZE = int(os.getenv("BROADCAST_SHARD_SIZE", "20000"))
+BROADCAST_SHARD_STALL_SECONDS = 120
+BROADCAST_CLEANUP_CHUNK_SIZE = 5000
+
+BOT_DB_EXECUTOR_WORKERS = int(os.getenv("BOT_DB_EXECUTOR_WORKERS", 8))
+USER_SNAPSHOT_TTL_SECONDS = 300
+USER_SNAPSHOT_LOCAL_TTL_SECONDS = 60
+USER_SNAPSHOT_LOCAL_MAX_SIZE = 10000
+OUTBOX_RELAY_BATCH_SIZE = 500
+OUTBOX_RELAY_DELAY_SECONDS = 1
+OUTBOX_RETENTION_HOURS = 24
+PAYMENT_RECONCILE_AFTER_MINUTES = 15
+PAYMENT_RECONCILE_BATCH_SIZE = 100
+PAYMENT_RECONCILE_CONCURRENCY = 10
+PAYMENT_CONFIRM_LOCK_SECONDS = 30
+PAYMENT_CONFIRM_RESULT_SECONDS = 5
+PAYMENT_REUSE_TTL_SECONDS = int(os.getenv("PAYMENT_REUSE_TTL_SECONDS", 600))
 VLESS_LINK_PARAMS = {
     "host": os.getenv("VLESS_HOST"),
     "port": os.getenv("VLESS_PORT"),
@@ -140,6 +175,9 @@ CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
 
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+CELERY_TASK_ROUTES = {
+    "backend.sender.tasks.run_broadcast_shard_task": {"queue": "broadcasts"},
+}
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
@@ -156,5 +194,6 @@ ADMIN_REORDER = [
     {"app": "notifications", "label": "Уведомления и Правила"},
     {"app": "content", "label": "Настройки и Контент"},
     {"app": "sender", "label": "Рассылки"},
+    {"app": "outbox", "label": "Очередь событий"},
     {"app": "django_celery_beat", "label": "Планировщик задач (Celery Beat)"},
 ]
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Callable, TypeVar
+
+from aiogram import Bot
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class TelegramRuntime:
+    def __init__(self):
+        self.pid: int | None = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.thread: threading.Thread | None = None
+        self.bot: Bot | None = None
+        self.lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(
+                target=self.loop.run_forever, name="telegram-runtime", daemon=True
+            )
+            self.thread.start()
+            self.bot = Bot(token=settings.BOT_TOKEN)
+            self.pid = os.getpid()
+            logger.info(f"Telegram runtime запущен в процессе {self.pid}")
+
+    async def _call(self, func: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        await sync_to_async(close_old_connections)()
+        return await func(self.bot, *args, **kwargs)
+
+    def run(self, func: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(
+            self._call(func, *args, **kwargs), self.loop
+        )
+        return future.result()
+
+    def stop(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                return
+            asyncio.run_coroutine_threadsafe(
+                self.bot.session.close(), self.loop
+            ).result(timeout=10)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=10)
+            self.pid = None
+
+
+telegram_runtime = TelegramRuntime()
+
+
+def run_with_bot(func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+    return telegram_runtime.run(func, *args, **kwargs)
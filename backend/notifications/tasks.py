@@ -1,16 +1,21 @@
 import asyncio
 import logging
-from datetime import timedelta
+from collections import deque
 
 from aiogram import Bot
 from aiogram.enums import ParseMode
-from aiogram.exceptions import TelegramAPIError
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.types import Message
 from celery import shared_task
 from django.conf import settings
+from django.db import connection, transaction
 from django.utils import timezone
 
+from backend.core.telegram import run_with_bot
+from backend.sender.services import BroadcastSender
+from backend.users.cache import invalidate_user_snapshots
 from backend.vpn.models import Subscription
-from backend.vpn.tasks import deactivate_vpn_client_task
+from backend.vpn.tasks import queue_vpn_client_states
 from bot.keyboards.inline_keyboards import get_subscription_reminder_kb
 
 from .models import NotificationRule, SentNotification
@@ -18,22 +23,59 @@ from .models import NotificationRule, SentNotification
 logger = logging.getLogger(__name__)
 
 
-async def send_message_async(telegram_id: int, text: str, keyboard=None):
-    bot = Bot(token=settings.BOT_TOKEN)
+EXPIRED_SUBSCRIPTION_MESSAGE = "Обращаем внимание, Ваша подписка закончилась и vpn остановлен! Докупите дней и подписка останется активной!"
+
+
+async def _send_message(
+    bot: Bot, telegram_id: int, text: str, keyboard=None
+) -> Message | None:
     try:
-        await bot.send_message(
+        message = await bot.send_message(
             chat_id=telegram_id,
             text=text,
             reply_markup=keyboard,
             parse_mode=ParseMode.HTML,
         )
-        logger.info(f"Сообщение успешно отправлено пользователю {telegram_id}")
-        return True
+    except TelegramRetryAfter:
+        raise
     except TelegramAPIError as e:
         logger.error(f"Не удалось отправить сообщение пользователю {telegram_id}: {e}")
-        return False
-    finally:
-        await bot.session.close()
+        return None
+    logger.info(f"Сообщение успешно отправлено пользователю {telegram_id}")
+    return message
+
+
+async def send_messages_async(
+    bot: Bot, messages: list[tuple[int, str]], keyboard=None
+) -> int:
+    pending: dict[int, deque[str]] = {}
+    for telegram_id, text in messages:
+        pending.setdefault(telegram_id, deque()).append(text)
+
+    sent = 0
+
+    async def send(telegram_id: int) -> Message | None:
+        nonlocal sent
+        texts = pending[telegram_id]
+        message = None
+        first = True
+        while texts:
+            if not first:
+                await asyncio.sleep(settings.BROADCAST_PER_CHAT_INTERVAL_SECONDS)
+                await sender.bucket.acquire()
+            first = False
+            message = await _send_message(bot, telegram_id, texts[0], keyboard)
+            texts.popleft()
+            if message is not None:
+                sent += 1
+        return message
+
+    async def skip_result(telegram_id: int, message: Message | None):
+        pass
+
+    sender = BroadcastSender(send, name="Уведомления")
+    await sender.run(list(pending), skip_result)
+    return sent
 
 
 @shared_task
@@ -41,64 +83,120 @@ def send_telegram_notification_task(
     telegram_id: int, text: str, with_keyboard: bool = False
 ):
     keyboard = get_subscription_reminder_kb() if with_keyboard else None
-    asyncio.run(send_message_async(telegram_id, text, keyboard))
+    run_with_bot(send_messages_async, [(telegram_id, text)], keyboard)
+
+
+@shared_task
+def send_telegram_notifications_task(
+    messages: list[tuple[int, str]], with_keyboard: bool = False
+):
+    keyboard = get_subscription_reminder_kb() if with_keyboard else None
+    sent = run_with_bot(send_messages_async, messages, keyboard)
+    logger.info(f"Пакет уведомлений: отправлено {sent} из {len(messages)}")
+
+
+def _dispatch_expired_chunk(subscription_ids: list[int], telegram_ids: list[int]):
+    invalidate_user_snapshots(telegram_ids)
+    queue_vpn_client_states(subscription_ids, enable=False)
+    send_telegram_notifications_task.delay(
+        [(telegram_id, EXPIRED_SUBSCRIPTION_MESSAGE) for telegram_id in telegram_ids],
+        with_keyboard=True,
+    )
 
 
 @shared_task
 def check_and_deactivate_expired_subscriptions():
     now = timezone.now()
-    expired_subscriptions = Subscription.objects.filter(
-        end_date__lte=now, is_vpn_client_active=True
+    chunk_size = settings.EXPIRY_SWEEP_CHUNK_SIZE
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            chunk = list(
+                Subscription.objects.select_for_update(skip_locked=True)
+                .filter(end_date__lte=now, is_vpn_client_active=True)
+                .order_by("id")
+                .values_list("id", "user_id")[:chunk_size]
+            )
+            if not chunk:
+                break
+
+            subscription_ids = [sub_id for sub_id, _ in chunk]
+            telegram_ids = [user_id for _, user_id in chunk]
+            Subscription.objects.filter(id__in=subscription_ids).update(
+                is_vpn_client_active=False
+            )
+            transaction.on_commit(
+                lambda ids=subscription_ids, tg_ids=telegram_ids: _dispatch_expired_chunk(
+                    ids, tg_ids
+                )
+            )
+
+        total += len(chunk)
+        if len(chunk) < chunk_size:
+            break
+
+    if total:
+        logger.info(f"Истекло подписок: {total}. VPN-клиенты отключаются пакетно.")
+
+
+CLAIM_REMINDERS_SQL = """
+    WITH claimed AS (
+        INSERT INTO {sent} (user_id, rule_id, subscription_end_date_at_send_time, sent_at)
+        SELECT s.user_id, r.id, s.end_date, %(now)s
+        FROM {subscription} s
+        JOIN {rule} r
+          ON r.is_active
+         AND s.end_date BETWEEN %(now)s + r.trigger_hours_before_expiry * INTERVAL '1 hour'
+                            AND %(now)s + r.trigger_hours_before_expiry * INTERVAL '1 hour'
+                                + INTERVAL '10 minutes'
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {sent} n
+            WHERE n.user_id = s.user_id
+              AND n.rule_id = r.id
+              AND n.subscription_end_date_at_send_time = s.end_date
+        )
+        ON CONFLICT (user_id, rule_id, subscription_end_date_at_send_time) DO NOTHING
+        RETURNING user_id, rule_id, subscription_end_date_at_send_time
     )
+    SELECT c.user_id, c.subscription_end_date_at_send_time, r.message_template
+    FROM claimed c
+    JOIN {rule} r ON r.id = c.rule_id
+"""
 
-    for sub in expired_subscriptions:
-        logger.info(f"Подписка для user_id={sub.user.telegram_id} истекла. Отключаем.")
-        deactivate_vpn_client_task.delay(sub.id)
-
-        sub.is_vpn_client_active = False
-        sub.save(update_fields=["is_vpn_client_active"])
 
-        message = "Обращаем внимание, Ваша подписка закончилась и vpn остановлен! Докупите дней и подписка останется активной!"
-        send_telegram_notification_task.delay(
-            sub.user.telegram_id, message, with_keyboard=True
-        )
+def _claim_unsent_reminders(now):
+    sql = CLAIM_REMINDERS_SQL.format(
+        subscription=Subscription._meta.db_table,
+        rule=NotificationRule._meta.db_table,
+        sent=SentNotification._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {"now": now})
+        return cursor.fetchall()
 
 
 @shared_task
 def send_expiry_reminders():
     now = timezone.now()
-    active_rules = NotificationRule.objects.filter(is_active=True)
-
-    for rule in active_rules:
-        trigger_time_start = now + timedelta(hours=rule.trigger_hours_before_expiry)
-        trigger_time_end = trigger_time_start + timedelta(minutes=10)
-
-        subscriptions_to_notify = Subscription.objects.filter(
-            end_date__range=(trigger_time_start, trigger_time_end)
+    claimed = _claim_unsent_reminders(now)
+    if not claimed:
+        return
+
+    messages = []
+    for user_id, end_date, message_template in claimed:
+        days_left = (end_date - now).days
+        hours_left = int(((end_date - now).total_seconds() % 86400) / 3600)
+        messages.append(
+            (user_id, message_template.format(days=days_left, hours=hours_left))
         )
 
-        for sub in subscriptions_to_notify:
-            already_sent = SentNotification.objects.filter(
-                user=sub.user,
-                rule=rule,
-                subscription_end_date_at_send_time=sub.end_date,
-            ).exists()
-
-            if not already_sent:
-                days_left = (sub.end_date - now).days
-                hours_left = int(((sub.end_date - now).total_seconds() % 86400) / 3600)
-
-                message = rule.message_template.format(days=days_left, hours=hours_left)
-
-                send_telegram_notification_task.delay(
-                    sub.user.telegram_id, message, with_keyboard=True
-                )
+    batch_size = settings.NOTIFICATION_BATCH_SIZE
+    for i in range(0, len(messages), batch_size):
+        send_telegram_notifications_task.delay(
+            messages[i : i + batch_size], with_keyboard=True
+        )
 
-                SentNotification.objects.create(
-                    user=sub.user,
-                    rule=rule,
-                    subscription_end_date_at_send_time=sub.end_date,
-                )
-                logger.info(
-                    f"Отправлено уведомление по правилу '{rule.name}' для user_id={sub.user.telegram_id}"
-                )
+    logger.info(
+        f"Поставлено в очередь напоминаний об окончании подписки: {len(messages)}"
+    )
@@ -0,0 +1,16 @@
+from django.contrib import admin
+
+from .models import OutboxEvent
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ("kind", "aggregate_id", "created_at", "dispatched_at")
+    list_filter = ("kind", "dispatched_at")
+    search_fields = ("aggregate_id",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
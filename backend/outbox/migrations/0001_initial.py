@@ -0,0 +1,30 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('VPN_CLIENT_ACTIVATE', 'Активация клиента VPN')], max_length=50, verbose_name='Тип')),
+                ('aggregate_id', models.BigIntegerField(verbose_name='ID объекта')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('dispatched_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата отправки')),
+            ],
+            options={
+                'verbose_name': 'Событие',
+                'verbose_name_plural': 'События',
+                'indexes': [models.Index(condition=models.Q(('dispatched_at__isnull', True)), fields=['id'], name='pending_outbox_event_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('dispatched_at__isnull', True)), fields=('kind', 'aggregate_id'), name='unique_pending_outbox_event')],
+            },
+        ),
+    ]
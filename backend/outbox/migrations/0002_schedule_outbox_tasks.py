@@ -0,0 +1,36 @@
+from django.db import migrations
+
+PERIODIC_TASKS = [
+    ('Отправка событий outbox', 'backend.outbox.tasks.relay_outbox_events_task', 1),
+    ('Метрики outbox', 'backend.outbox.tasks.log_outbox_metrics_task', 15),
+]
+
+
+def schedule_outbox_tasks(apps, schema_editor):
+    IntervalSchedule = apps.get_model('django_celery_beat', 'IntervalSchedule')
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+
+    for name, task, every_minutes in PERIODIC_TASKS:
+        schedule, _ = IntervalSchedule.objects.get_or_create(
+            every=every_minutes, period='minutes'
+        )
+        PeriodicTask.objects.get_or_create(
+            name=name, defaults={'task': task, 'interval': schedule}
+        )
+
+
+def unschedule_outbox_tasks(apps, schema_editor):
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTask.objects.filter(name__in=[name for name, _, _ in PERIODIC_TASKS]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_celery_beat', '0019_alter_periodictasks_options'),
+        ('outbox', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(schedule_outbox_tasks, unschedule_outbox_tasks),
+    ]
@@ -0,0 +1,34 @@
+from django.db import models
+
+
+class OutboxEvent(models.Model):
+    class Kind(models.TextChoices):
+        VPN_CLIENT_ACTIVATE = "VPN_CLIENT_ACTIVATE", "Активация клиента VPN"
+
+    kind = models.CharField(max_length=50, choices=Kind.choices, verbose_name="Тип")
+    aggregate_id = models.BigIntegerField(verbose_name="ID объекта")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    dispatched_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Дата отправки"
+    )
+
+    def __str__(self):
+        return f"{self.get_kind_display()} для {self.aggregate_id}"
+
+    class Meta:
+        verbose_name = "Событие"
+        verbose_name_plural = "События"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "aggregate_id"],
+                condition=models.Q(dispatched_at__isnull=True),
+                name="unique_pending_outbox_event",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(dispatched_at__isnull=True),
+                name="pending_outbox_event_idx",
+            )
+        ]
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from .models import OutboxEvent
+
+RELAY_SCHEDULED_KEY = "outbox:relay_scheduled"
+
+
+def schedule_outbox_relay():
+    from .tasks import relay_outbox_events_task
+
+    delay = settings.OUTBOX_RELAY_DELAY_SECONDS
+    redis = get_redis_connection("default")
+    if redis.set(RELAY_SCHEDULED_KEY, 1, nx=True, ex=max(delay * 10, 10)):
+        relay_outbox_events_task.apply_async(countdown=delay)
+
+
+def publish_outbox_event(kind: str, aggregate_id: int):
+    OutboxEvent.objects.bulk_create(
+        [OutboxEvent(kind=kind, aggregate_id=aggregate_id)], ignore_conflicts=True
+    )
+    transaction.on_commit(schedule_outbox_relay, robust=True)
@@ -0,0 +1,101 @@
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Min
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from backend.vpn.tasks import queue_vpn_client_states
+
+from .models import OutboxEvent
+from .services import RELAY_SCHEDULED_KEY
+
+logger = logging.getLogger(__name__)
+
+
+def _activate_vpn_clients(subscription_ids: list[int]):
+    queue_vpn_client_states(subscription_ids, enable=True)
+
+
+EVENT_HANDLERS = {
+    OutboxEvent.Kind.VPN_CLIENT_ACTIVATE: _activate_vpn_clients,
+}
+
+
+def _relay_batch(batch_size: int) -> int:
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(dispatched_at__isnull=True)
+            .order_by("id")
+            .values_list("id", "kind", "aggregate_id")[:batch_size]
+        )
+        if not events:
+            return 0
+
+        aggregate_ids_by_kind: dict[str, list[int]] = {}
+        for _, kind, aggregate_id in events:
+            aggregate_ids_by_kind.setdefault(kind, []).append(aggregate_id)
+
+        for kind, aggregate_ids in aggregate_ids_by_kind.items():
+            EVENT_HANDLERS[kind](aggregate_ids)
+
+        OutboxEvent.objects.filter(id__in=[event[0] for event in events]).update(
+            dispatched_at=timezone.now()
+        )
+    return len(events)
+
+
+def get_outbox_metrics() -> dict[str, float]:
+    now = timezone.now()
+    lag = F("dispatched_at") - F("created_at")
+    pending = OutboxEvent.objects.filter(dispatched_at__isnull=True).aggregate(
+        count=Count("id"), oldest=Min("created_at")
+    )
+    dispatched = OutboxEvent.objects.filter(
+        dispatched_at__gte=now - timedelta(hours=1)
+    ).aggregate(avg_lag=Avg(lag), max_lag=Max(lag))
+    return {
+        "pending": pending["count"],
+        "oldest_pending_seconds": (
+            (now - pending["oldest"]).total_seconds() if pending["oldest"] else 0
+        ),
+        "avg_lag_seconds": (
+            dispatched["avg_lag"].total_seconds() if dispatched["avg_lag"] else 0
+        ),
+        "max_lag_seconds": (
+            dispatched["max_lag"].total_seconds() if dispatched["max_lag"] else 0
+        ),
+    }
+
+
+@shared_task
+def relay_outbox_events_task():
+    get_redis_connection("default").delete(RELAY_SCHEDULED_KEY)
+
+    batch_size = settings.OUTBOX_RELAY_BATCH_SIZE
+    relayed = 0
+    while True:
+        count = _relay_batch(batch_size)
+        relayed += count
+        if count < batch_size:
+            break
+
+    OutboxEvent.objects.filter(
+        dispatched_at__lt=timezone.now()
+        - timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+    ).delete()
+
+    if relayed:
+        logger.info(f"Отправлено событий из outbox: {relayed}")
+    return relayed
+
+
+@shared_task
+def log_outbox_metrics_task():
+    metrics = get_outbox_metrics()
+    logger.info(f"Метрики outbox: {metrics}")
+    return metrics
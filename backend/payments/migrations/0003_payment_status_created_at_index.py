@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_alter_payment_status'),
+        ('users', '0002_alter_user_telegram_id'),
+        ('vpn', '0002_alter_subscription_total_paid_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'created_at'], name='payments_pa_status_343680_idx'),
+        ),
+    ]
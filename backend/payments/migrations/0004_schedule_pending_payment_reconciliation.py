@@ -0,0 +1,37 @@
+from django.db import migrations
+
+TASK_NAME = 'Сверка зависших платежей с ЮKassa'
+
+
+def schedule_pending_payment_reconciliation(apps, schema_editor):
+    IntervalSchedule = apps.get_model('django_celery_beat', 'IntervalSchedule')
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+
+    schedule, _ = IntervalSchedule.objects.get_or_create(every=5, period='minutes')
+    PeriodicTask.objects.get_or_create(
+        name=TASK_NAME,
+        defaults={
+            'task': 'backend.payments.tasks.reconcile_pending_payments_task',
+            'interval': schedule,
+        },
+    )
+
+
+def unschedule_pending_payment_reconciliation(apps, schema_editor):
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTask.objects.filter(name=TASK_NAME).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_celery_beat', '0019_alter_periodictasks_options'),
+        ('payments', '0003_payment_status_created_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            schedule_pending_payment_reconciliation,
+            unschedule_pending_payment_reconciliation,
+        ),
+    ]
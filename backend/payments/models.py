@@ -36,3 +36,4 @@ class Payment(models.Model):
         verbose_name = "Платеж"
         verbose_name_plural = "Платежи"
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "created_at"])]
@@ -0,0 +1,99 @@
+import logging
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from backend.outbox.models import OutboxEvent
+from backend.outbox.services import publish_outbox_event
+from backend.referrals.tasks import process_referral_bonus_for_payment
+from backend.users.cache import invalidate_user_snapshots_on_commit
+from backend.vpn.models import Subscription
+
+from .models import Payment
+
+logger = logging.getLogger(__name__)
+
+
+def open_payment_cache_key(user_id: int, tariff_id: int) -> str:
+    return f"payments:open:{user_id}:{tariff_id}"
+
+
+def remember_open_payment(payment: Payment, confirmation_url: str):
+    cache.set(
+        open_payment_cache_key(payment.user_id, payment.tariff_id),
+        (confirmation_url, payment.payment_id_provider),
+        timeout=settings.PAYMENT_REUSE_TTL_SECONDS,
+    )
+
+
+def get_open_payment(
+    user_id: int, tariff_id: int, amount: Decimal
+) -> tuple[str, str] | None:
+    cached = cache.get(open_payment_cache_key(user_id, tariff_id))
+    if not cached:
+        return None
+
+    confirmation_url, payment_id_provider = cached
+    is_open = Payment.objects.filter(
+        payment_id_provider=payment_id_provider,
+        status=Payment.Status.PENDING,
+        amount=amount,
+    ).exists()
+    return (confirmation_url, payment_id_provider) if is_open else None
+
+
+def forget_open_payment(payment: Payment):
+    transaction.on_commit(
+        lambda: cache.delete(open_payment_cache_key(payment.user_id, payment.tariff_id))
+    )
+
+
+def settle_payment(
+    payment_id_provider: str, succeeded: bool, amount: Decimal | None = None
+) -> Payment | None:
+    with transaction.atomic():
+        payment = (
+            Payment.objects.select_for_update(of=("self",))
+            .select_related("user", "tariff")
+            .filter(
+                payment_id_provider=payment_id_provider,
+                status=Payment.Status.PENDING,
+            )
+            .first()
+        )
+        if not payment:
+            return None
+
+        if not succeeded:
+            payment.status = Payment.Status.CANCELED
+            payment.save(update_fields=["status", "updated_at"])
+            forget_open_payment(payment)
+            logger.info(f"Платеж {payment_id_provider} отменен.")
+            return payment
+
+        if amount is not None and amount != payment.amount:
+            logger.error(
+                f"Сумма платежа {payment_id_provider} не совпадает: "
+                f"ожидалось {payment.amount}, получено {amount}"
+            )
+            return None
+
+        subscription = Subscription.objects.select_for_update().get(user=payment.user)
+
+        subscription.extend_subscription(days=payment.tariff.duration_days)
+        subscription.total_paid += payment.amount
+        subscription.save(update_fields=["total_paid"])
+
+        payment.status = Payment.Status.SUCCEEDED
+        payment.save()
+        forget_open_payment(payment)
+        invalidate_user_snapshots_on_commit([payment.user_id])
+
+        if not subscription.is_vpn_client_active:
+            publish_outbox_event(OutboxEvent.Kind.VPN_CLIENT_ACTIVATE, subscription.id)
+
+    process_referral_bonus_for_payment.delay(payment.id)
+    logger.info(f"Платеж {payment_id_provider} зачислен.")
+    return payment
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import os
+from datetime import timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+
+from bot.utils.payments import YooKassaClient, YooKassaError
+
+from .models import Payment
+from .services import settle_payment
+
+logger = logging.getLogger(__name__)
+
+
+async def fetch_provider_payment(
+    client: YooKassaClient, semaphore: asyncio.Semaphore, payment_id_provider: str
+) -> dict | None:
+    async with semaphore:
+        try:
+            return await client.get_payment(payment_id_provider)
+        except YooKassaError as e:
+            if e.status == 404:
+                return {"status": "canceled"}
+            logger.warning(f"Не удалось проверить платеж {payment_id_provider}: {e}")
+        except Exception as e:
+            logger.warning(f"Не удалось проверить платеж {payment_id_provider}: {e}")
+        return None
+
+
+async def reconcile_pending_payments_async() -> dict[str, int]:
+    threshold = timezone.now() - timedelta(
+        minutes=settings.PAYMENT_RECONCILE_AFTER_MINUTES
+    )
+    batch_size = settings.PAYMENT_RECONCILE_BATCH_SIZE
+    stale_payments = (
+        Payment.objects.filter(status=Payment.Status.PENDING, created_at__lt=threshold)
+        .order_by("id")
+        .values_list("id", "payment_id_provider")
+    )
+    counts = {"checked": 0, "succeeded": 0, "canceled": 0, "pending": 0, "errors": 0}
+
+    client = YooKassaClient(
+        shop_id=os.getenv("YOOKASSA_SHOP_ID"),
+        secret_key=os.getenv("YOOKASSA_SECRET_KEY"),
+    )
+    semaphore = asyncio.Semaphore(settings.PAYMENT_RECONCILE_CONCURRENCY)
+    last_id = 0
+    try:
+        while True:
+            batch = [
+                row async for row in stale_payments.filter(id__gt=last_id)[:batch_size]
+            ]
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            provider_payments = await asyncio.gather(
+                *(
+                    fetch_provider_payment(client, semaphore, payment_id_provider)
+                    for _, payment_id_provider in batch
+                )
+            )
+
+            canceled_ids = []
+            for (payment_id, payment_id_provider), provider_payment in zip(
+                batch, provider_payments
+            ):
+                counts["checked"] += 1
+                status = provider_payment["status"] if provider_payment else None
+                if status == "succeeded":
+                    amount = Decimal(provider_payment["amount"]["value"])
+                    settled = await sync_to_async(settle_payment)(
+                        payment_id_provider, succeeded=True, amount=amount
+                    )
+                    if settled:
+                        counts["succeeded"] += 1
+                elif status == "canceled":
+                    canceled_ids.append(payment_id)
+                elif status is None:
+                    counts["errors"] += 1
+                else:
+                    counts["pending"] += 1
+
+            if canceled_ids:
+                counts["canceled"] += await Payment.objects.filter(
+                    id__in=canceled_ids, status=Payment.Status.PENDING
+                ).aupdate(status=Payment.Status.CANCELED, updated_at=timezone.now())
+
+            if len(batch) < batch_size:
+                break
+    finally:
+        await client.close()
+
+    return counts
+
+
+@shared_task
+def reconcile_pending_payments_task():
+    counts = asyncio.run(reconcile_pending_payments_async())
+    logger.info(f"Сверка ожидающих платежей с ЮKassa: {counts}")
+    return counts
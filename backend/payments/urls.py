@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+app_name = "payments"
+
+urlpatterns = [
+    path("yookassa/webhook/", views.yookassa_webhook, name="yookassa_webhook"),
+]
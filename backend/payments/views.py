@@ -1,3 +1,51 @@
-from django.shortcuts import render
+import json
+import logging
+from decimal import Decimal, InvalidOperation
 
-# Create your views here.
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from yookassa.domain.common import SecurityHelper
+
+from .services import settle_payment
+
+logger = logging.getLogger(__name__)
+
+
+def get_client_ip(request) -> str:
+    return request.META.get("HTTP_X_REAL_IP") or request.META.get("REMOTE_ADDR", "")
+
+
+@csrf_exempt
+@require_POST
+def yookassa_webhook(request):
+    ip = get_client_ip(request)
+    try:
+        is_trusted = SecurityHelper().is_ip_trusted(ip)
+    except Exception:
+        is_trusted = False
+    if not is_trusted:
+        logger.warning(f"Уведомление ЮKassa с недоверенного IP {ip} отклонено.")
+        return HttpResponseForbidden()
+
+    try:
+        notification = json.loads(request.body)
+        event = notification["event"]
+        payment_object = notification["object"]
+        payment_id_provider = payment_object["id"]
+    except (ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest()
+
+    if event == "payment.succeeded":
+        try:
+            amount = Decimal(payment_object["amount"]["value"])
+        except (KeyError, TypeError, InvalidOperation):
+            logger.warning(
+                f"Уведомление ЮKassa о платеже {payment_id_provider} без корректной суммы отклонено."
+            )
+            return HttpResponseBadRequest()
+        settle_payment(payment_id_provider, succeeded=True, amount=amount)
+    elif event == "payment.canceled":
+        settle_payment(payment_id_provider, succeeded=False)
+
+    return HttpResponse(status=200)
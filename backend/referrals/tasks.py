@@ -1,25 +1,24 @@
-import asyncio
 import logging
 
 from aiogram import Bot
 from aiogram.enums import ParseMode
 from celery import shared_task
-from django.conf import settings
 from django.db import transaction
 
+from backend.core.telegram import run_with_bot
 from backend.payments.models import Payment
+from backend.users.cache import invalidate_user_snapshots_on_commit
 from backend.vpn.models import Subscription
-from backend.vpn.tasks import ensure_vpn_client_active_task
+from backend.vpn.tasks import queue_vpn_client_state
 
 from .models import ReferralBonus, ReferralTier
 
 logger = logging.getLogger(__name__)
 
 
-async def send_notification_async(telegram_id: int, text: str):
+async def send_notification_async(bot: Bot, telegram_id: int, text: str):
     from bot.keyboards.inline_keyboards import get_dismiss_kb
 
-    bot = Bot(token=settings.BOT_TOKEN)
     try:
         await bot.send_message(
             chat_id=telegram_id,
@@ -32,8 +31,6 @@ async def send_notification_async(telegram_id: int, text: str):
         logger.error(
             f"Не удалось отправить уведомление о реф. бонусе {telegram_id}: {e}"
         )
-    finally:
-        await bot.session.close()
 
 
 @shared_task
@@ -42,7 +39,7 @@ def send_bonus_notification_task(referrer_telegram_id: int, bonus_days: int):
         f"Класс! За реферальную активность на Ваш лицевой счет начислено "
         f"{bonus_days} бонусных дней."
     )
-    asyncio.run(send_notification_async(referrer_telegram_id, text))
+    run_with_bot(send_notification_async, referrer_telegram_id, text)
 
 
 @shared_task
@@ -93,6 +90,7 @@ def process_referral_bonus_for_payment(payment_id: int):
                 triggering_payment=payment,
                 bonus_days_awarded=bonus_days_to_award,
             )
+            invalidate_user_snapshots_on_commit([referrer.telegram_id])
 
         if not was_active_before_bonus:
             referrer_subscription.refresh_from_db()
@@ -100,7 +98,7 @@ def process_referral_bonus_for_payment(payment_id: int):
                 logger.info(
                     f"Подписка реферера {referrer.telegram_id} была неактивна. Активируем клиента в 3x-ui."
                 )
-                ensure_vpn_client_active_task.delay(referrer_subscription.id)
+                queue_vpn_client_state(referrer_subscription.id, enable=True)
 
         logger.info(
             f"Начислен бонус {bonus_days_to_award} дней для {referrer.telegram_id} за покупку от {buyer.telegram_id}"
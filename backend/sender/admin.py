@@ -1,10 +1,29 @@
 from django.contrib import admin, messages
 from django.db import transaction
 
-from .models import Broadcast, SentBroadcastMessage
+from .models import Broadcast, BroadcastShard, SentBroadcastMessage
 from .tasks import send_broadcast_for_approval_task
 
 
+class BroadcastShardInline(admin.TabularInline):
+    model = BroadcastShard
+    fields = (
+        "start_after_telegram_id",
+        "end_telegram_id",
+        "last_processed_telegram_id",
+        "sent_count",
+        "failed_count",
+        "is_completed",
+        "heartbeat_at",
+    )
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Broadcast)
 class BroadcastAdmin(admin.ModelAdmin):
     list_display = (
@@ -12,17 +31,19 @@ class BroadcastAdmin(admin.ModelAdmin):
         "short_text",
         "created_at",
         "status",
+        "audience",
         "media_type",
     )
-    list_filter = ("status", "media_type", "created_at")
+    list_filter = ("status", "audience", "media_type", "created_at")
     search_fields = ("text",)
     ordering = ("-created_at",)
     readonly_fields = ("status",)
+    inlines = (BroadcastShardInline,)
     fieldsets = (
         (
             "Содержимое рассылки",
             {
-                "fields": ("text", ("media_file", "media_type")),
+                "fields": ("text", ("media_file", "media_type"), "audience"),
                 "description": "Заполните текст и, при необходимости, прикрепите медиафайл. После сохранения рассылка отправится на подтверждение администратору.",
             },
         ),
@@ -59,6 +80,8 @@ class BroadcastAdmin(admin.ModelAdmin):
                 messages.SUCCESS,
             )
         else:
+            if {"media_file", "media_type"} & set(form.changed_data):
+                obj.media_file_id = None
             super().save_model(request, obj, form, change)
 
     @admin.display(description="Текст", ordering="text")
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sender', '0002_alter_broadcast_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='broadcast',
+            name='media_file_id',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True, verbose_name='file_id медиафайла в Telegram'),
+        ),
+    ]
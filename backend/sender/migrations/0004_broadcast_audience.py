@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sender', '0003_broadcast_media_file_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='broadcast',
+            name='audience',
+            field=models.CharField(choices=[('ALL', 'Все пользователи'), ('ACTIVE', 'С активной подпиской'), ('EXPIRED', 'С истекшей подпиской'), ('REFERRERS', 'Пригласившие друзей')], default='ALL', max_length=10, verbose_name='Получатели'),
+        ),
+    ]
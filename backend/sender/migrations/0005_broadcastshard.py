@@ -0,0 +1,81 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sender", "0004_broadcast_audience"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BroadcastShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "start_after_telegram_id",
+                    models.BigIntegerField(
+                        blank=True, null=True, verbose_name="Начиная после telegram_id"
+                    ),
+                ),
+                (
+                    "end_telegram_id",
+                    models.BigIntegerField(
+                        blank=True,
+                        null=True,
+                        verbose_name="До telegram_id (включительно)",
+                    ),
+                ),
+                (
+                    "last_processed_telegram_id",
+                    models.BigIntegerField(
+                        blank=True,
+                        null=True,
+                        verbose_name="Последний обработанный telegram_id",
+                    ),
+                ),
+                (
+                    "sent_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Отправлено"),
+                ),
+                (
+                    "failed_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Ошибок"),
+                ),
+                (
+                    "is_completed",
+                    models.BooleanField(default=False, verbose_name="Завершен"),
+                ),
+                (
+                    "heartbeat_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Последняя активность"
+                    ),
+                ),
+                (
+                    "broadcast",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shards",
+                        to="sender.broadcast",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Часть рассылки",
+                "verbose_name_plural": "Части рассылки",
+                "ordering": ["id"],
+            },
+        ),
+    ]
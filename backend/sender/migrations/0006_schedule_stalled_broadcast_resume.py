@@ -0,0 +1,36 @@
+from django.db import migrations
+
+TASK_NAME = 'Возобновление зависших рассылок'
+
+
+def schedule_stalled_broadcast_resume(apps, schema_editor):
+    IntervalSchedule = apps.get_model('django_celery_beat', 'IntervalSchedule')
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+
+    schedule, _ = IntervalSchedule.objects.get_or_create(every=5, period='minutes')
+    PeriodicTask.objects.get_or_create(
+        name=TASK_NAME,
+        defaults={
+            'task': 'backend.sender.tasks.resume_stalled_broadcasts_task',
+            'interval': schedule,
+        },
+    )
+
+
+def unschedule_stalled_broadcast_resume(apps, schema_editor):
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTask.objects.filter(name=TASK_NAME).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_celery_beat', '0019_alter_periodictasks_options'),
+        ('sender', '0005_broadcastshard'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            schedule_stalled_broadcast_resume, unschedule_stalled_broadcast_resume
+        ),
+    ]
@@ -12,6 +12,12 @@ class Broadcast(models.Model):
         CANCELED = "CANCELED", "Отклонено"
         ERROR = "ERROR", "Ошибка"
 
+    class Audience(models.TextChoices):
+        ALL = "ALL", "Все пользователи"
+        ACTIVE = "ACTIVE", "С активной подпиской"
+        EXPIRED = "EXPIRED", "С истекшей подпиской"
+        REFERRERS = "REFERRERS", "Пригласившие друзей"
+
     class MediaType(models.TextChoices):
         PHOTO = "PHOTO", "Фото"
         VIDEO = "VIDEO", "Видео"
@@ -37,6 +43,19 @@ class Broadcast(models.Model):
         verbose_name="Тип медиафайла",
         help_text="Необходимо указать тип, если вы прикрепили медиафайл.",
     )
+    media_file_id = models.CharField(
+        max_length=255,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="file_id медиафайла в Telegram",
+    )
+    audience = models.CharField(
+        max_length=10,
+        choices=Audience.choices,
+        default=Audience.ALL,
+        verbose_name="Получатели",
+    )
     status = models.CharField(
         max_length=10,
         choices=Status.choices,
@@ -54,6 +73,41 @@ class Broadcast(models.Model):
         ordering = ["-created_at"]
 
 
+class BroadcastShard(models.Model):
+    broadcast = models.ForeignKey(
+        Broadcast, on_delete=models.CASCADE, related_name="shards"
+    )
+    start_after_telegram_id = models.BigIntegerField(
+        null=True, blank=True, verbose_name="Начиная после telegram_id"
+    )
+    end_telegram_id = models.BigIntegerField(
+        null=True, blank=True, verbose_name="До telegram_id (включительно)"
+    )
+    last_processed_telegram_id = models.BigIntegerField(
+        null=True, blank=True, verbose_name="Последний обработанный telegram_id"
+    )
+    sent_count = models.PositiveIntegerField(default=0, verbose_name="Отправлено")
+    failed_count = models.PositiveIntegerField(default=0, verbose_name="Ошибок")
+    is_completed = models.BooleanField(default=False, verbose_name="Завершен")
+    heartbeat_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Последняя активность"
+    )
+
+    @property
+    def resume_after_telegram_id(self):
+        if self.last_processed_telegram_id is not None:
+            return self.last_processed_telegram_id
+        return self.start_after_telegram_id
+
+    def __str__(self):
+        return f"Часть {self.id} рассылки {self.broadcast_id}"
+
+    class Meta:
+        verbose_name = "Часть рассылки"
+        verbose_name_plural = "Части рассылки"
+        ordering = ["id"]
+
+
 class SentBroadcastMessage(models.Model):
     broadcast = models.ForeignKey(
         Broadcast, on_delete=models.CASCADE, related_name="sent_messages"
@@ -0,0 +1,388 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterable, Awaitable, Callable, Iterable
+
+from aiogram.exceptions import TelegramRetryAfter
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, QuerySet
+from django.utils import timezone
+from redis.asyncio import Redis
+
+from backend.users.models import User
+
+from .models import Broadcast, BroadcastShard, SentBroadcastMessage
+
+logger = logging.getLogger(__name__)
+
+
+def get_audience_queryset(audience: str) -> QuerySet[User]:
+    now = timezone.now()
+    users = User.objects.all()
+    if audience == Broadcast.Audience.ACTIVE:
+        return users.filter(subscription__end_date__gt=now)
+    if audience == Broadcast.Audience.EXPIRED:
+        return users.filter(subscription__end_date__lte=now)
+    if audience == Broadcast.Audience.REFERRERS:
+        return users.filter(Exists(User.objects.filter(referred_by=OuterRef("pk"))))
+    return users
+
+
+async def iter_recipient_ids(
+    audience: str,
+    after_id: int | None = None,
+    up_to_id: int | None = None,
+    batch_size: int | None = None,
+):
+    batch_size = batch_size or settings.BROADCAST_RECIPIENTS_BATCH_SIZE
+    recipients = (
+        get_audience_queryset(audience)
+        .order_by("telegram_id")
+        .values_list("telegram_id", flat=True)
+    )
+    if up_to_id is not None:
+        recipients = recipients.filter(telegram_id__lte=up_to_id)
+    last_id = after_id
+    while True:
+        page = (
+            recipients
+            if last_id is None
+            else recipients.filter(telegram_id__gt=last_id)
+        )
+        telegram_ids = [telegram_id async for telegram_id in page[:batch_size]]
+        for telegram_id in telegram_ids:
+            yield telegram_id
+        if len(telegram_ids) < batch_size:
+            return
+        last_id = telegram_ids[-1]
+
+
+def split_into_shards(broadcast: Broadcast) -> list[BroadcastShard]:
+    shard_size = settings.BROADCAST_SHARD_SIZE
+    recipients = (
+        get_audience_queryset(broadcast.audience)
+        .order_by("telegram_id")
+        .values_list("telegram_id", flat=True)
+    )
+    shards = []
+    start_after = None
+    while True:
+        page = (
+            recipients
+            if start_after is None
+            else recipients.filter(telegram_id__gt=start_after)
+        )
+        end = list(page[shard_size - 1 : shard_size])
+        end_id = end[0] if end else None
+        shards.append(
+            BroadcastShard(
+                broadcast=broadcast,
+                start_after_telegram_id=start_after,
+                end_telegram_id=end_id,
+            )
+        )
+        if end_id is None:
+            break
+        start_after = end_id
+    return BroadcastShard.objects.bulk_create(shards)
+
+
+def approve_broadcast(broadcast: Broadcast) -> list[BroadcastShard] | None:
+    with transaction.atomic():
+        approved = Broadcast.objects.filter(
+            pk=broadcast.pk, status=Broadcast.Status.PENDING_APPROVAL
+        ).update(status=Broadcast.Status.APPROVED)
+        if not approved:
+            return None
+        return split_into_shards(broadcast)
+
+
+class ShardProgress:
+    def __init__(self, shard: BroadcastShard):
+        self.shard = shard
+        self.last_processed_id = shard.last_processed_telegram_id
+        self.sent = shard.sent_count
+        self.failed = shard.failed_count
+        self.in_flight: deque[int] = deque()
+        self.finished: set[int] = set()
+
+    def track(self, recipient_ids):
+        async def tracked():
+            async for telegram_id in recipient_ids:
+                self.in_flight.append(telegram_id)
+                yield telegram_id
+
+        return tracked()
+
+    def finish(self, telegram_id: int, success: bool):
+        if success:
+            self.sent += 1
+        else:
+            self.failed += 1
+        self.finished.add(telegram_id)
+        while self.in_flight and self.in_flight[0] in self.finished:
+            self.last_processed_id = self.in_flight.popleft()
+            self.finished.discard(self.last_processed_id)
+
+    async def save(self):
+        await BroadcastShard.objects.filter(pk=self.shard.pk).aupdate(
+            last_processed_telegram_id=self.last_processed_id,
+            sent_count=self.sent,
+            failed_count=self.failed,
+            heartbeat_at=timezone.now(),
+        )
+
+
+class SentMessageBuffer:
+    def __init__(self, broadcast_id: int, progress: ShardProgress | None = None):
+        self.broadcast_id = broadcast_id
+        self.progress = progress
+        self.max_size = settings.BROADCAST_SAVE_BATCH_SIZE
+        self.max_delay = settings.BROADCAST_SAVE_INTERVAL_SECONDS
+        self.rows: list[SentBroadcastMessage] = []
+        self.full = asyncio.Event()
+        self.lock = asyncio.Lock()
+        self.flusher: asyncio.Task | None = None
+
+    def add(self, user_id: int, message_id: int):
+        self.rows.append(
+            SentBroadcastMessage(
+                broadcast_id=self.broadcast_id, user_id=user_id, message_id=message_id
+            )
+        )
+        if len(self.rows) >= self.max_size:
+            self.full.set()
+
+    async def flush(self):
+        async with self.lock:
+            rows, self.rows = self.rows, []
+            self.full.clear()
+            if rows:
+                await SentBroadcastMessage.objects.abulk_create(
+                    rows, ignore_conflicts=True
+                )
+            if self.progress:
+                await self.progress.save()
+
+    async def _flush_periodically(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.full.wait(), timeout=self.max_delay)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception(
+                    f"Рассылка {self.broadcast_id}: не удалось сохранить отправленные сообщения: {e}"
+                )
+
+    async def __aenter__(self):
+        self.flusher = asyncio.create_task(self._flush_periodically())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.flusher.cancel()
+        await asyncio.gather(self.flusher, return_exceptions=True)
+        await self.flush()
+
+
+TELEGRAM_RATE_LIMIT_KEY = "telegram:rate_limit"
+
+# One bucket in Redis is shared by every sender in every worker process, so
+# broadcasts, cleanups and notifications together stay under Telegram's
+# global limit. Returns how long to wait before asking again (0 = acquired).
+ACQUIRE_TOKEN_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at', 'paused_until')
+local paused_until = tonumber(state[3]) or 0
+if now < paused_until then
+    return tostring(paused_until - now)
+end
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - updated_at) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], 60)
+return tostring(wait)
+"""
+
+PAUSE_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local seconds = tonumber(ARGV[1])
+local paused_until = tonumber(redis.call('HGET', KEYS[1], 'paused_until')) or 0
+redis.call('HSET', KEYS[1], 'paused_until', tostring(math.max(paused_until, now + seconds)))
+redis.call('EXPIRE', KEYS[1], math.ceil(seconds) + 60)
+"""
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate: float,
+        capacity: float | None = None,
+        key: str = TELEGRAM_RATE_LIMIT_KEY,
+    ):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.key = key
+        self.redis = Redis.from_url(settings.CACHES["default"]["LOCATION"])
+        self.acquire_script = self.redis.register_script(ACQUIRE_TOKEN_SCRIPT)
+        self.pause_script = self.redis.register_script(PAUSE_BUCKET_SCRIPT)
+
+    async def pause(self, seconds: float):
+        await self.pause_script(keys=[self.key], args=[seconds])
+
+    async def acquire(self):
+        while True:
+            wait = float(
+                await self.acquire_script(
+                    keys=[self.key], args=[self.rate, self.capacity]
+                )
+            )
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+class ThroughputMeter:
+    def __init__(self, name: str, log_interval: float):
+        self.name = name
+        self.log_interval = log_interval
+        self.sent = 0
+        self.failed = 0
+        self.started_at = time.monotonic()
+        self.logged_at = self.started_at
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.sent / elapsed if elapsed > 0 else 0.0
+
+    def record(self, success: bool):
+        if success:
+            self.sent += 1
+        else:
+            self.failed += 1
+
+        now = time.monotonic()
+        if now - self.logged_at >= self.log_interval:
+            self.logged_at = now
+            self.log()
+
+    def log(self):
+        logger.info(
+            f"{self.name}: отправлено {self.sent}, ошибок {self.failed}, "
+            f"{self.rate:.1f} сообщений/с"
+        )
+
+
+async def _iterate(chat_ids: Iterable[int] | AsyncIterable[int]):
+    if isinstance(chat_ids, AsyncIterable):
+        async for chat_id in chat_ids:
+            yield chat_id
+    else:
+        for chat_id in chat_ids:
+            yield chat_id
+
+
+SendFunc = Callable[[int], Awaitable[Any]]
+ResultCallback = Callable[[int, Any], Awaitable[None]]
+
+
+class BroadcastSender:
+    def __init__(self, send: SendFunc, name: str):
+        self.send = send
+        self.concurrency = settings.BROADCAST_CONCURRENCY
+        self.per_chat_interval = settings.BROADCAST_PER_CHAT_INTERVAL_SECONDS
+        self.max_retries = settings.BROADCAST_MAX_RETRIES
+        self.bucket = TokenBucket(settings.BROADCAST_RATE_PER_SECOND)
+        self.meter = ThroughputMeter(name, settings.BROADCAST_PROGRESS_LOG_SECONDS)
+        self.last_sent_to_chat: dict[int, float] = {}
+
+    async def _wait_for_chat(self, chat_id: int):
+        last_sent = self.last_sent_to_chat.get(chat_id)
+        if last_sent is not None:
+            delay = last_sent + self.per_chat_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        self.last_sent_to_chat[chat_id] = time.monotonic()
+
+    def _forget_idle_chats(self):
+        threshold = time.monotonic() - self.per_chat_interval
+        self.last_sent_to_chat = {
+            chat_id: sent_at
+            for chat_id, sent_at in self.last_sent_to_chat.items()
+            if sent_at > threshold
+        }
+
+    async def send_one(self, chat_id: int) -> Any:
+        for attempt in range(self.max_retries + 1):
+            await self._wait_for_chat(chat_id)
+            await self.bucket.acquire()
+            try:
+                return await self.send(chat_id)
+            except TelegramRetryAfter as e:
+                logger.warning(
+                    f"{self.meter.name}: flood control для {chat_id}, "
+                    f"пауза {e.retry_after} с (попытка {attempt + 1})"
+                )
+                await self.bucket.pause(e.retry_after)
+                await asyncio.sleep(e.retry_after)
+        return None
+
+    async def _worker(self, queue: asyncio.Queue, on_result: ResultCallback):
+        while True:
+            chat_id = await queue.get()
+            message = None
+            try:
+                message = await self.send_one(chat_id)
+            except Exception as e:
+                logger.exception(f"{self.meter.name}: ошибка отправки {chat_id}: {e}")
+            try:
+                self.meter.record(message is not None)
+                await on_result(chat_id, message)
+            except Exception as e:
+                logger.exception(f"{self.meter.name}: ошибка обработки {chat_id}: {e}")
+            finally:
+                queue.task_done()
+
+    async def run(
+        self,
+        chat_ids: Iterable[int] | AsyncIterable[int],
+        on_result: ResultCallback,
+    ) -> ThroughputMeter:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [
+            asyncio.create_task(self._worker(queue, on_result))
+            for _ in range(self.concurrency)
+        ]
+        try:
+            async for chat_id in _iterate(chat_ids):
+                await queue.put(chat_id)
+                if len(self.last_sent_to_chat) > 10_000:
+                    self._forget_idle_chats()
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await self.bucket.close()
+
+        self.meter.log()
+        return self.meter
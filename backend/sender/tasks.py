@@ -7,28 +7,57 @@ from aiogram.exceptions import (
     TelegramAPIError,
     TelegramBadRequest,
     TelegramForbiddenError,
+    TelegramRetryAfter,
 )
 from aiogram.types import FSInputFile, Message
 from asgiref.sync import sync_to_async
 from celery import shared_task
 from django.conf import settings
+from django.db.models import Q
 from django.utils import timezone
 
 from backend.content.models import BroadcastSettings
-from backend.users.models import User
+from backend.core.telegram import run_with_bot
 from bot.keyboards.inline_keyboards import get_broadcast_approval_kb
 
-from .models import Broadcast, SentBroadcastMessage
+from .models import Broadcast, BroadcastShard, SentBroadcastMessage
+from .services import (
+    BroadcastSender,
+    SentMessageBuffer,
+    ShardProgress,
+    approve_broadcast,
+    get_audience_queryset,
+    iter_recipient_ids,
+)
 
 logger = logging.getLogger(__name__)
 
+TELEGRAM_DELETE_MESSAGES_LIMIT = 100
+
+
+def get_media_file_id(message: Message) -> str | None:
+    if message.photo:
+        return message.photo[-1].file_id
+    media = message.video or message.document or message.audio or message.animation
+    return media.file_id if media else None
+
+
+async def remember_media_file_id(broadcast: Broadcast, message: Message):
+    file_id = get_media_file_id(message)
+    if not file_id:
+        return
+    broadcast.media_file_id = file_id
+    await Broadcast.objects.filter(pk=broadcast.pk, media_file_id__isnull=True).aupdate(
+        media_file_id=file_id
+    )
+
 
 async def send_media_or_text(
     bot: Bot, chat_id: int, broadcast: Broadcast, keyboard=None
 ) -> Message | None:
     try:
         if broadcast.media_file and broadcast.media_type:
-            file = FSInputFile(broadcast.media_file.path)
+            file = broadcast.media_file_id or FSInputFile(broadcast.media_file.path)
             media_type = broadcast.media_type
             sender_map = {
                 Broadcast.MediaType.PHOTO: bot.send_photo,
@@ -38,13 +67,18 @@ async def send_media_or_text(
             }
             sender = sender_map.get(media_type)
             if sender:
-                return await sender(
+                message = await sender(
                     chat_id, file, caption=broadcast.text, reply_markup=keyboard
                 )
+                if not broadcast.media_file_id:
+                    await remember_media_file_id(broadcast, message)
+                return message
         else:
             return await bot.send_message(
                 chat_id, broadcast.text, reply_markup=keyboard
             )
+    except TelegramRetryAfter:
+        raise
     except TelegramForbiddenError:
         logger.warning(
             f"Не удалось отправить сообщение пользователю {chat_id} (заблокировал бота)."
@@ -56,10 +90,10 @@ async def send_media_or_text(
 
 @shared_task
 def send_broadcast_for_approval_task(broadcast_id: int):
-    asyncio.run(send_broadcast_for_approval_async(broadcast_id))
+    run_with_bot(send_broadcast_for_approval_async, broadcast_id)
 
 
-async def send_broadcast_for_approval_async(broadcast_id: int):
+async def send_broadcast_for_approval_async(bot: Bot, broadcast_id: int):
     try:
         settings_obj = await BroadcastSettings.objects.select_related(
             "broadcast_admin"
@@ -75,11 +109,9 @@ async def send_broadcast_for_approval_async(broadcast_id: int):
             return
 
         broadcast = await Broadcast.objects.aget(id=broadcast_id)
-        bot = Bot(token=settings.BOT_TOKEN)
         keyboard = get_broadcast_approval_kb(broadcast_id)
 
         await send_media_or_text(bot, admin.telegram_id, broadcast, keyboard)
-        await bot.session.close()
         logger.info(
             f"Рассылка {broadcast_id} отправлена на подтверждение администратору {admin.telegram_id}."
         )
@@ -97,76 +129,197 @@ async def send_broadcast_for_approval_async(broadcast_id: int):
 
 @shared_task
 def start_mass_broadcast_task(broadcast_id: int):
-    asyncio.run(run_mass_broadcast_async(broadcast_id))
+    asyncio.run(start_mass_broadcast_async(broadcast_id))
 
 
-async def run_mass_broadcast_async(broadcast_id: int):
+async def start_mass_broadcast_async(broadcast_id: int):
     try:
         broadcast = await Broadcast.objects.aget(id=broadcast_id)
-        broadcast.status = Broadcast.Status.APPROVED
-        await broadcast.asave(update_fields=["status"])
-
-        users_to_send = await sync_to_async(list)(User.objects.all())
-        if not users_to_send:
-            logger.warning(f"Рассылка {broadcast_id}: нет пользователей для отправки.")
-            broadcast.status = Broadcast.Status.ERROR
-            await broadcast.asave(update_fields=["status"])
-            return
-
-        bot = Bot(token=settings.BOT_TOKEN)
-
-        for user in users_to_send:
-            message = await send_media_or_text(bot, user.telegram_id, broadcast)
-            if message:
-                await SentBroadcastMessage.objects.acreate(
-                    broadcast=broadcast, user=user, message_id=message.message_id
+        if broadcast.status == Broadcast.Status.PENDING_APPROVAL:
+            if not await get_audience_queryset(broadcast.audience).aexists():
+                logger.warning(
+                    f"Рассылка {broadcast_id}: нет пользователей для отправки."
                 )
+                await Broadcast.objects.filter(
+                    pk=broadcast_id, status=Broadcast.Status.PENDING_APPROVAL
+                ).aupdate(status=Broadcast.Status.ERROR)
+                return
+            shards = await sync_to_async(approve_broadcast)(broadcast)
+            if shards is not None:
+                logger.info(f"Рассылка {broadcast_id} разбита на {len(shards)} частей.")
+        elif broadcast.status != Broadcast.Status.APPROVED:
+            return
 
-        await bot.session.close()
-        broadcast.status = Broadcast.Status.SENT
-        await broadcast.asave(update_fields=["status"])
-        logger.info(f"Рассылка {broadcast_id} успешно отправлена всем пользователям.")
+        async for shard_id in BroadcastShard.objects.filter(
+            broadcast_id=broadcast_id, is_completed=False
+        ).values_list("id", flat=True):
+            run_broadcast_shard_task.delay(shard_id)
 
     except Broadcast.DoesNotExist:
         logger.error(f"Рассылка с ID {broadcast_id} не найдена для массовой отправки.")
     except Exception as e:
         logger.exception(
-            f"Критическая ошибка при выполнении массовой рассылки {broadcast_id}: {e}"
+            f"Критическая ошибка при запуске массовой рассылки {broadcast_id}: {e}"
         )
         await Broadcast.objects.filter(pk=broadcast_id).aupdate(
             status=Broadcast.Status.ERROR
         )
 
 
-@shared_task
-def delete_old_broadcast_messages_task():
-    asyncio.run(delete_old_broadcast_messages_async())
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def run_broadcast_shard_task(shard_id: int):
+    run_with_bot(run_broadcast_shard_async, shard_id)
 
 
-async def delete_old_broadcast_messages_async():
-    time_threshold = timezone.now() - timedelta(hours=24)
-    messages_to_delete = await sync_to_async(list)(
-        SentBroadcastMessage.objects.filter(sent_at__lt=time_threshold).select_related(
-            "user"
-        )
+def retry_shard_later(shard_id: int):
+    run_broadcast_shard_task.apply_async(
+        (shard_id,), countdown=settings.BROADCAST_SHARD_STALL_SECONDS
+    )
+
+
+def get_pending_shards():
+    return BroadcastShard.objects.filter(
+        is_completed=False, broadcast__status=Broadcast.Status.APPROVED
+    )
+
+
+async def claim_shard(shard_id: int) -> bool:
+    now = timezone.now()
+    stalled_before = now - timedelta(seconds=settings.BROADCAST_SHARD_STALL_SECONDS)
+    claimed = await (
+        get_pending_shards()
+        .filter(pk=shard_id)
+        .filter(Q(heartbeat_at__isnull=True) | Q(heartbeat_at__lt=stalled_before))
+        .aupdate(heartbeat_at=now)
     )
-    if not messages_to_delete:
+    return bool(claimed)
+
+
+async def run_broadcast_shard_async(bot: Bot, shard_id: int):
+    if not await claim_shard(shard_id):
+        # A redelivered task usually finds the dead worker's heartbeat still
+        # fresh; come back once it is stale instead of dropping the shard.
+        if await get_pending_shards().filter(pk=shard_id).aexists():
+            retry_shard_later(shard_id)
         return
 
-    logger.info(f"Найдено {len(messages_to_delete)} сообщений для удаления.")
-    bot = Bot(token=settings.BOT_TOKEN)
+    shard = await BroadcastShard.objects.select_related("broadcast").aget(id=shard_id)
+    broadcast = shard.broadcast
+    progress = ShardProgress(shard)
+    sender = BroadcastSender(
+        lambda chat_id: send_media_or_text(bot, chat_id, broadcast),
+        name=f"Рассылка {broadcast.id}, часть {shard.id}",
+    )
+    try:
+        async with SentMessageBuffer(broadcast.id, progress) as sent_messages:
 
-    for sent_msg in messages_to_delete:
-        try:
-            await bot.delete_message(
-                chat_id=sent_msg.user.telegram_id, message_id=sent_msg.message_id
+            async def save_sent_message(chat_id: int, message: Message | None):
+                if message:
+                    sent_messages.add(chat_id, message.message_id)
+                progress.finish(chat_id, message is not None)
+
+            recipients = iter_recipient_ids(
+                broadcast.audience,
+                after_id=shard.resume_after_telegram_id,
+                up_to_id=shard.end_telegram_id,
             )
-        except (TelegramAPIError, TelegramBadRequest) as e:
-            logger.warning(
-                f"Не удалось удалить сообщение {sent_msg.message_id} для пользователя {sent_msg.user.telegram_id}: {e}"
+            await sender.run(progress.track(recipients), save_sent_message)
+    except Exception as e:
+        logger.exception(
+            f"Ошибка в части {shard_id} рассылки {broadcast.id}, она будет возобновлена: {e}"
+        )
+        await BroadcastShard.objects.filter(pk=shard_id).aupdate(heartbeat_at=None)
+        retry_shard_later(shard_id)
+        return
+
+    await BroadcastShard.objects.filter(pk=shard_id).aupdate(is_completed=True)
+    has_pending_shards = await BroadcastShard.objects.filter(
+        broadcast_id=broadcast.id, is_completed=False
+    ).aexists()
+    if not has_pending_shards:
+        await Broadcast.objects.filter(
+            pk=broadcast.id, status=Broadcast.Status.APPROVED
+        ).aupdate(status=Broadcast.Status.SENT)
+        logger.info(f"Рассылка {broadcast.id} успешно отправлена всем пользователям.")
+
+
+@shared_task
+def resume_stalled_broadcasts_task():
+    stalled_before = timezone.now() - timedelta(
+        seconds=settings.BROADCAST_SHARD_STALL_SECONDS
+    )
+    shard_ids = list(
+        get_pending_shards()
+        .filter(Q(heartbeat_at__isnull=True) | Q(heartbeat_at__lt=stalled_before))
+        .values_list("id", flat=True)
+    )
+    for shard_id in shard_ids:
+        run_broadcast_shard_task.delay(shard_id)
+    if shard_ids:
+        logger.info(f"Возобновлено зависших частей рассылок: {len(shard_ids)}")
+
+
+@shared_task
+def delete_old_broadcast_messages_task():
+    run_with_bot(delete_old_broadcast_messages_async)
+
+
+async def delete_chat_messages(bot: Bot, chat_id: int, message_ids: list[int]):
+    try:
+        for i in range(0, len(message_ids), TELEGRAM_DELETE_MESSAGES_LIMIT):
+            await bot.delete_messages(
+                chat_id=chat_id,
+                message_ids=message_ids[i : i + TELEGRAM_DELETE_MESSAGES_LIMIT],
             )
-        finally:
-            await sent_msg.adelete()
+        return True
+    except TelegramRetryAfter:
+        raise
+    except (TelegramAPIError, TelegramBadRequest) as e:
+        logger.warning(
+            f"Не удалось удалить сообщения {message_ids} для пользователя {chat_id}: {e}"
+        )
+        return None
+
+
+async def delete_old_broadcast_messages_async(bot: Bot):
+    time_threshold = timezone.now() - timedelta(hours=24)
+    chunk_size = settings.BROADCAST_CLEANUP_CHUNK_SIZE
+    old_messages = (
+        SentBroadcastMessage.objects.filter(sent_at__lt=time_threshold)
+        .order_by("id")
+        .values_list("id", "user_id", "message_id")
+    )
+
+    message_ids_by_chat: dict[int, list[int]] = {}
+    sender = BroadcastSender(
+        lambda chat_id: delete_chat_messages(
+            bot, chat_id, message_ids_by_chat[chat_id]
+        ),
+        name="Удаление старых сообщений рассылки",
+    )
+
+    async def skip_result(chat_id: int, result):
+        pass
+
+    total = 0
+    last_id = 0
+    while True:
+        chunk = [row async for row in old_messages.filter(id__gt=last_id)[:chunk_size]]
+        if not chunk:
+            break
+
+        message_ids_by_chat.clear()
+        for _, user_id, message_id in chunk:
+            message_ids_by_chat.setdefault(user_id, []).append(message_id)
+
+        await sender.run(list(message_ids_by_chat), skip_result)
+        await SentBroadcastMessage.objects.filter(
+            id__in=[row[0] for row in chunk]
+        ).adelete()
+
+        total += len(chunk)
+        last_id = chunk[-1][0]
 
-    await bot.session.close()
+    if total:
+        logger.info(f"Удалено старых сообщений рассылки: {total}.")
     logger.info("Задача по удалению старых сообщений рассылки завершена.")
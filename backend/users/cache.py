@@ -0,0 +1,127 @@
+from datetime import datetime
+from typing import Iterable
+from uuid import UUID, uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from backend.vpn.models import Subscription
+
+from .models import User
+
+SNAPSHOT_INVALIDATION_CHANNEL = "users:snapshot:invalidate"
+
+
+def user_snapshot_version_key(telegram_id: int) -> str:
+    return f"users:snapshot:version:{telegram_id}"
+
+
+def user_snapshot_cache_key(telegram_id: int, version: str) -> str:
+    return f"users:snapshot:v2:{telegram_id}:{version}"
+
+
+class SubscriptionSnapshot:
+    __slots__ = (
+        "id",
+        "telegram_id",
+        "end_date",
+        "trial_activated",
+        "vless_uuid",
+        "server_id",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        telegram_id: int,
+        end_date: datetime,
+        trial_activated: bool,
+        vless_uuid: UUID,
+        server_id: int | None,
+    ):
+        self.id = id
+        self.telegram_id = telegram_id
+        self.end_date = end_date
+        self.trial_activated = trial_activated
+        self.vless_uuid = vless_uuid
+        self.server_id = server_id
+
+    is_active = Subscription.is_active
+    days_remaining = Subscription.days_remaining
+
+
+class UserSnapshot:
+    __slots__ = ("telegram_id", "username", "subscription")
+
+    def __init__(
+        self, telegram_id: int, username: str | None, subscription: SubscriptionSnapshot
+    ):
+        self.telegram_id = telegram_id
+        self.username = username
+        self.subscription = subscription
+
+
+def build_user_snapshot(user: User) -> UserSnapshot:
+    subscription = user.subscription
+    return UserSnapshot(
+        telegram_id=user.telegram_id,
+        username=user.username,
+        subscription=SubscriptionSnapshot(
+            id=subscription.id,
+            telegram_id=user.telegram_id,
+            end_date=subscription.end_date,
+            trial_activated=subscription.trial_activated,
+            vless_uuid=subscription.vless_uuid,
+            server_id=subscription.server_id,
+        ),
+    )
+
+
+def load_user_snapshot(telegram_id: int) -> UserSnapshot | None:
+    # The version is read before the query, so a load that raced with an
+    # invalidation writes its stale snapshot under a key nobody reads anymore.
+    # Versions are random tokens rather than a counter, so an expired version
+    # key can never come back as a value an old snapshot was stored under.
+    version = get_redis_connection("default").get(
+        user_snapshot_version_key(telegram_id)
+    )
+    key = user_snapshot_cache_key(
+        telegram_id, version.decode() if version else "initial"
+    )
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    user = (
+        User.objects.select_related("subscription")
+        .filter(telegram_id=telegram_id)
+        .first()
+    )
+    if user is None:
+        return None
+
+    snapshot = build_user_snapshot(user)
+    cache.set(key, snapshot, timeout=settings.USER_SNAPSHOT_TTL_SECONDS)
+    return snapshot
+
+
+def invalidate_user_snapshots(telegram_ids: Iterable[int]):
+    telegram_ids = list(telegram_ids)
+    if not telegram_ids:
+        return
+
+    version_ttl = settings.USER_SNAPSHOT_TTL_SECONDS * 2
+    with get_redis_connection("default").pipeline(transaction=False) as pipe:
+        for telegram_id in telegram_ids:
+            pipe.set(
+                user_snapshot_version_key(telegram_id), uuid4().hex, ex=version_ttl
+            )
+        pipe.publish(SNAPSHOT_INVALIDATION_CHANNEL, ",".join(map(str, telegram_ids)))
+        pipe.execute()
+
+
+def invalidate_user_snapshots_on_commit(telegram_ids: Iterable[int]):
+    telegram_ids = list(telegram_ids)
+    transaction.on_commit(lambda: invalidate_user_snapshots(telegram_ids))
@@ -0,0 +1,73 @@
+import asyncio
+import statistics
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.users.models import User
+from bot.utils.executor import run_in_db_executor
+
+
+def read_user_with_subscription(telegram_id: int):
+    return (
+        User.objects.select_related("subscription")
+        .filter(telegram_id=telegram_id)
+        .first()
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает конкурентные чтения пользователя через стандартный "
+        "sync_to_async и через пул потоков бота (run_in_db_executor)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=100)
+        parser.add_argument("--telegram-id", type=int)
+
+    def handle(self, *args, **options):
+        telegram_id = options["telegram_id"] or (
+            User.objects.values_list("telegram_id", flat=True).first()
+        )
+        if telegram_id is None:
+            raise CommandError("В базе нет пользователей для чтения.")
+
+        readers = {
+            "sync_to_async": sync_to_async(read_user_with_subscription),
+            "run_in_db_executor": run_in_db_executor(read_user_with_subscription),
+        }
+        for name, read in readers.items():
+            asyncio.run(
+                self.measure(
+                    name,
+                    read,
+                    telegram_id,
+                    options["requests"],
+                    options["concurrency"],
+                )
+            )
+
+    async def measure(self, name, read, telegram_id, total, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def timed_read():
+            async with semaphore:
+                started_at = time.perf_counter()
+                await read(telegram_id)
+                latencies.append(time.perf_counter() - started_at)
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(timed_read() for _ in range(total)))
+        elapsed = time.perf_counter() - started_at
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f"{name}: {total / elapsed:.0f} запросов/с, "
+            f"p50 {statistics.median(latencies) * 1000:.1f} мс, "
+            f"p95 {p95 * 1000:.1f} мс"
+        )
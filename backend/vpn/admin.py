@@ -1,10 +1,11 @@
 from django.contrib import admin
-from django.db.models import Sum
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
 
 from backend.payments.models import Payment
 from backend.referrals.models import ReferralBonus
 
-from .models import Subscription, Tariff
+from .models import Subscription, Tariff, VpnServer
 
 
 @admin.register(Tariff)
@@ -13,6 +14,28 @@ class TariffAdmin(admin.ModelAdmin):
     list_editable = ("is_active", "order")
 
 
+@admin.register(VpnServer)
+class VpnServerAdmin(admin.ModelAdmin):
+    list_display = ("name", "panel_url", "inbound_id", "load", "capacity", "is_active")
+    list_editable = ("capacity", "is_active")
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                active_subscriptions=Count(
+                    "subscriptions",
+                    filter=Q(subscriptions__end_date__gt=timezone.now()),
+                )
+            )
+        )
+
+    @admin.display(description="Активных подписок", ordering="active_subscriptions")
+    def load(self, obj: VpnServer) -> int:
+        return obj.active_subscriptions
+
+
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = (
@@ -22,8 +45,8 @@ class SubscriptionAdmin(admin.ModelAdmin):
         "bonus_subscription_days",
     )
     search_fields = ("user__telegram_id", "user__username")
-    list_filter = ("end_date", "trial_activated")
-    readonly_fields = ("vless_uuid",)
+    list_filter = ("end_date", "trial_activated", "server")
+    readonly_fields = ("vless_uuid", "server")
 
     @admin.display(boolean=True, description="Активна")
     def is_active(self, obj):
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vpn', '0002_alter_subscription_total_paid_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VpnServer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Название')),
+                ('panel_url', models.URLField(verbose_name='URL панели 3x-ui')),
+                ('panel_username', models.CharField(max_length=255, verbose_name='Логин панели')),
+                ('panel_password', models.CharField(max_length=255, verbose_name='Пароль панели')),
+                ('inbound_id', models.PositiveIntegerField(default=1, verbose_name='ID inbound')),
+                ('link_host', models.CharField(max_length=255, verbose_name='Хост для ключа')),
+                ('link_port', models.PositiveIntegerField(default=443, verbose_name='Порт для ключа')),
+                ('link_pbk', models.CharField(max_length=255, verbose_name='Public key (pbk)')),
+                ('link_sni', models.CharField(max_length=255, verbose_name='SNI')),
+                ('link_sid', models.CharField(blank=True, max_length=255, verbose_name='Short ID (sid)')),
+                ('capacity', models.PositiveIntegerField(default=1000, help_text='Сколько активных подписок можно разместить на сервере.', verbose_name='Вместимость')),
+                ('is_active', models.BooleanField(default=True, help_text='Выключите, чтобы не размещать на сервере новые подписки.', verbose_name='Принимает новых клиентов')),
+            ],
+            options={
+                'verbose_name': 'VPN сервер',
+                'verbose_name_plural': 'VPN серверы',
+            },
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='server',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='subscriptions', to='vpn.vpnserver', verbose_name='VPN сервер'),
+        ),
+    ]
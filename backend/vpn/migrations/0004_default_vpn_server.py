@@ -0,0 +1,40 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:07
+
+from django.conf import settings
+from django.db import migrations
+
+
+def create_default_server(apps, schema_editor):
+    VpnServer = apps.get_model('vpn', 'VpnServer')
+    Subscription = apps.get_model('vpn', 'Subscription')
+
+    xui_cfg = settings.XUI_SETTINGS
+    if not xui_cfg.get('url') or VpnServer.objects.exists():
+        return
+
+    link_params = settings.VLESS_LINK_PARAMS
+    server = VpnServer.objects.create(
+        name='Основной',
+        panel_url=xui_cfg['url'],
+        panel_username=xui_cfg['username'] or '',
+        panel_password=xui_cfg['password'] or '',
+        inbound_id=xui_cfg['inbound_id'],
+        link_host=link_params['host'] or '',
+        link_port=int(link_params['port'] or 443),
+        link_pbk=link_params['pbk'] or '',
+        link_sni=link_params['sni'] or '',
+        link_sid=link_params['sid'] or '',
+        capacity=max(Subscription.objects.count(), 1000),
+    )
+    Subscription.objects.update(server=server)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vpn', '0003_vpnserver'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_default_server, migrations.RunPython.noop),
+    ]
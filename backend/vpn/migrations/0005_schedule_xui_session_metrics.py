@@ -0,0 +1,36 @@
+from django.db import migrations
+
+TASK_NAME = 'Метрики сессий 3x-ui'
+
+
+def schedule_xui_session_metrics(apps, schema_editor):
+    IntervalSchedule = apps.get_model('django_celery_beat', 'IntervalSchedule')
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+
+    schedule, _ = IntervalSchedule.objects.get_or_create(every=15, period='minutes')
+    PeriodicTask.objects.get_or_create(
+        name=TASK_NAME,
+        defaults={
+            'task': 'backend.vpn.tasks.log_xui_session_metrics_task',
+            'interval': schedule,
+        },
+    )
+
+
+def unschedule_xui_session_metrics(apps, schema_editor):
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTask.objects.filter(name=TASK_NAME).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_celery_beat', '0019_alter_periodictasks_options'),
+        ('vpn', '0004_default_vpn_server'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            schedule_xui_session_metrics, unschedule_xui_session_metrics
+        ),
+    ]
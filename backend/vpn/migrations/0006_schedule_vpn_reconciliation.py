@@ -0,0 +1,36 @@
+from django.db import migrations
+
+TASK_NAME = 'Сверка VPN клиентов с 3x-ui'
+
+
+def schedule_vpn_reconciliation(apps, schema_editor):
+    IntervalSchedule = apps.get_model('django_celery_beat', 'IntervalSchedule')
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+
+    schedule, _ = IntervalSchedule.objects.get_or_create(every=1, period='hours')
+    PeriodicTask.objects.get_or_create(
+        name=TASK_NAME,
+        defaults={
+            'task': 'backend.vpn.tasks.reconcile_vpn_clients_task',
+            'interval': schedule,
+        },
+    )
+
+
+def unschedule_vpn_reconciliation(apps, schema_editor):
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTask.objects.filter(name=TASK_NAME).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_celery_beat', '0019_alter_periodictasks_options'),
+        ('vpn', '0005_schedule_xui_session_metrics'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            schedule_vpn_reconciliation, unschedule_vpn_reconciliation
+        ),
+    ]
@@ -24,6 +24,57 @@ class Tariff(models.Model):
         verbose_name_plural = "Тарифы"
 
 
+class VpnServer(models.Model):
+    name = models.CharField(max_length=100, verbose_name="Название")
+    panel_url = models.URLField(verbose_name="URL панели 3x-ui")
+    panel_username = models.CharField(max_length=255, verbose_name="Логин панели")
+    panel_password = models.CharField(max_length=255, verbose_name="Пароль панели")
+    inbound_id = models.PositiveIntegerField(default=1, verbose_name="ID inbound")
+    link_host = models.CharField(max_length=255, verbose_name="Хост для ключа")
+    link_port = models.PositiveIntegerField(default=443, verbose_name="Порт для ключа")
+    link_pbk = models.CharField(max_length=255, verbose_name="Public key (pbk)")
+    link_sni = models.CharField(max_length=255, verbose_name="SNI")
+    link_sid = models.CharField(
+        max_length=255, blank=True, verbose_name="Short ID (sid)"
+    )
+    capacity = models.PositiveIntegerField(
+        default=1000,
+        verbose_name="Вместимость",
+        help_text="Сколько активных подписок можно разместить на сервере.",
+    )
+    is_active = models.BooleanField(
+        default=True,
+        verbose_name="Принимает новых клиентов",
+        help_text="Выключите, чтобы не размещать на сервере новые подписки.",
+    )
+
+    @property
+    def xui_cfg(self):
+        return {
+            "url": self.panel_url,
+            "username": self.panel_username,
+            "password": self.panel_password,
+            "inbound_id": self.inbound_id,
+        }
+
+    @property
+    def link_params(self):
+        return {
+            "host": self.link_host,
+            "port": self.link_port,
+            "pbk": self.link_pbk,
+            "sni": self.link_sni,
+            "sid": self.link_sid,
+        }
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = "VPN сервер"
+        verbose_name_plural = "VPN серверы"
+
+
 class Subscription(models.Model):
     user = models.OneToOneField(
         User,
@@ -44,6 +95,15 @@ class Subscription(models.Model):
 
     is_vpn_client_active = models.BooleanField(default=False, verbose_name="Клиент VPN активен")
 
+    server = models.ForeignKey(
+        VpnServer,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="subscriptions",
+        verbose_name="VPN сервер",
+    )
+
     @property
     def is_active(self):
         return self.end_date > timezone.now()
@@ -0,0 +1,67 @@
+import heapq
+import logging
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from backend.users.cache import invalidate_user_snapshots_on_commit
+
+from .models import Subscription, VpnServer
+
+logger = logging.getLogger(__name__)
+
+
+def assign_servers(subscription_ids: list[int]) -> dict[int, int]:
+    with transaction.atomic():
+        rows = list(
+            Subscription.objects.select_for_update()
+            .filter(id__in=subscription_ids)
+            .values_list("id", "user_id", "server_id")
+        )
+        assignments = {sub_id: server_id for sub_id, _, server_id in rows if server_id}
+        unassigned = [
+            (sub_id, user_id) for sub_id, user_id, server_id in rows if not server_id
+        ]
+        if not unassigned:
+            return assignments
+
+        servers = list(
+            VpnServer.objects.select_for_update()
+            .filter(is_active=True, capacity__gt=0)
+            .order_by("id")
+        )
+        if not servers:
+            logger.error("Нет активных VPN серверов для размещения подписок.")
+            return assignments
+
+        loads = dict(
+            Subscription.objects.filter(server__in=servers, end_date__gt=timezone.now())
+            .values("server_id")
+            .annotate(load=Count("id"))
+            .values_list("server_id", "load")
+        )
+        heap = [
+            (loads.get(server.id, 0) / server.capacity, server.id, server.capacity)
+            for server in servers
+        ]
+        heapq.heapify(heap)
+
+        ids_by_server: dict[int, list[int]] = {}
+        for sub_id, _ in unassigned:
+            load_ratio, server_id, capacity = heapq.heappop(heap)
+            ids_by_server.setdefault(server_id, []).append(sub_id)
+            assignments[sub_id] = server_id
+            heapq.heappush(heap, (load_ratio + 1 / capacity, server_id, capacity))
+
+        for server_id, ids in ids_by_server.items():
+            Subscription.objects.filter(id__in=ids).update(server_id=server_id)
+
+        if min(load_ratio for load_ratio, _, _ in heap) > 1:
+            logger.warning(
+                "Все VPN серверы заполнены, подписки размещены сверх лимита."
+            )
+        invalidate_user_snapshots_on_commit([user_id for _, user_id in unassigned])
+
+    logger.info(f"Размещено подписок на VPN серверах: {len(unassigned)}")
+    return assignments
@@ -1,88 +1,262 @@
+import json
 import logging
+import os
+import threading
+import time
+from typing import Callable, Iterable, TypeVar
 
+import requests
 from django.conf import settings
+from django_redis import get_redis_connection
 from py3xui import Api, Client
+from redis.exceptions import RedisError
 
-from backend.vpn.models import Subscription
+from backend.vpn.models import Subscription, VpnServer
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
 
-class VpnService:
-    def __init__(self):
-        xui_cfg = settings.XUI_SETTINGS
+XUI_SESSION_METRICS_KEY = "vpn:xui_session_metrics"
+XUI_JSON_HEADERS = {"Accept": "application/json"}
+
+
+class XuiSession:
+    def __init__(self, xui_cfg: dict):
+        self.xui_cfg = xui_cfg
+        self.api: Api | None = None
+        self.logged_in_at = 0.0
+        self.lock = threading.Lock()
+        self.label = f"{xui_cfg['username']}@{xui_cfg['url']}"
+
+    def _count(self, metric: str):
         try:
-            self.api = Api(
-                host=xui_cfg["url"],
-                username=xui_cfg["username"],
-                password=xui_cfg["password"],
+            get_redis_connection("default").hincrby(
+                XUI_SESSION_METRICS_KEY, f"{metric}:{self.label}", 1
             )
-            self.api.login()
-        except Exception as e:
-            logger.error(f"[VpnService] Failed to connect to 3x-ui: {e}")
-            self.api = None
+        except RedisError as e:
+            logger.warning(f"[XuiSession] Failed to record {metric}: {e}")
 
-    def create_client(self, subscription: Subscription) -> bool:
-        if not self.api:
-            logger.error("[VpnService] API is not initialized")
-            return False
+    @property
+    def is_expired(self) -> bool:
+        ttl = settings.XUI_SESSION_TTL_SECONDS
+        return time.monotonic() - self.logged_in_at >= ttl
+
+    def _login(self) -> Api:
+        api = Api(
+            host=self.xui_cfg["url"],
+            username=self.xui_cfg["username"],
+            password=self.xui_cfg["password"],
+        )
+        api.login()
+        self.api = api
+        self.logged_in_at = time.monotonic()
+        self._count("logins")
+        return api
+
+    def get_api(self) -> Api:
+        with self.lock:
+            if self.api is None or self.is_expired:
+                return self._login()
+            api = self.api
+        self._count("logins_avoided")
+        return api
+
+    def relogin(self) -> Api:
+        self._count("relogins")
+        with self.lock:
+            return self._login()
+
+    @staticmethod
+    def _is_session_rejected(error: requests.RequestException) -> bool:
+        # An expired 3x-ui session is answered with 401/404 or a redirect to
+        # the login page, which py3xui then fails to parse as JSON.
+        if isinstance(error, requests.JSONDecodeError):
+            return True
+        response = error.response
+        return response is not None and (
+            response.status_code in (401, 404) or bool(response.history)
+        )
 
+    def call(self, func: Callable[[Api], T]) -> T:
+        api = self.get_api()
         try:
-            email = str(subscription.user.telegram_id)
-            client_uuid = str(subscription.vless_uuid)
-            inbound_id = settings.XUI_SETTINGS["inbound_id"]
+            result = func(api)
+        except requests.RequestException as e:
+            if not self._is_session_rejected(e):
+                raise
+            logger.info("[XuiSession] Session rejected by 3x-ui, logging in again")
+            result = func(self.relogin())
+        self._count("calls_served")
+        return result
+
+
+_sessions: dict[tuple[int, str, str], XuiSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_xui_session(xui_cfg: dict | None = None) -> XuiSession:
+    xui_cfg = xui_cfg or settings.XUI_SETTINGS
+    key = (os.getpid(), xui_cfg["url"], xui_cfg["username"])
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None or session.xui_cfg["password"] != xui_cfg["password"]:
+            session = XuiSession(xui_cfg)
+            _sessions[key] = session
+        return session
+
+
+def get_xui_session_metrics() -> dict[str, dict[str, int]]:
+    counters = get_redis_connection("default").hgetall(XUI_SESSION_METRICS_KEY)
+    metrics: dict[str, dict[str, int]] = {}
+    for field, value in counters.items():
+        metric, label = field.decode().split(":", 1)
+        metrics.setdefault(label, {})[metric] = int(value)
+    return metrics
+
+
+class VpnService:
+    def __init__(self, server: VpnServer | None = None):
+        xui_cfg = server.xui_cfg if server else settings.XUI_SETTINGS
+        self.session = get_xui_session(xui_cfg)
+        self.panel_url = xui_cfg["url"]
+        self.inbound_id = xui_cfg["inbound_id"]
 
-            new_client = Client(id=client_uuid, email=email, enable=True)
-            self.api.client.add(inbound_id, [new_client])
+    def _inbound_lock(self, timeout: int | None = None):
+        return get_redis_connection("default").lock(
+            f"vpn:inbound_lock:{self.panel_url}:{self.inbound_id}",
+            timeout=timeout or settings.XUI_INBOUND_LOCK_TIMEOUT_SECONDS,
+        )
 
-            logger.info(f"Created new VPN client for user {email}")
+    # py3xui's Inbound/Client models drop every key they do not know about when
+    # an inbound is written back, so inbound edits go through the raw JSON.
+    def _read_inbound(self) -> tuple[dict, dict]:
+        def read(api: Api) -> dict:
+            url = api.inbound._url(f"panel/api/inbounds/get/{self.inbound_id}")
+            return api.inbound._get(url, XUI_JSON_HEADERS).json()["obj"]
+
+        inbound = self.session.call(read)
+        return inbound, json.loads(inbound["settings"])
+
+    def _write_inbound(self, inbound: dict, inbound_settings: dict):
+        data = {key: value for key, value in inbound.items() if key != "clientStats"}
+        data["settings"] = json.dumps(inbound_settings, ensure_ascii=False, indent=2)
+
+        def write(api: Api):
+            url = api.inbound._url(f"panel/api/inbounds/update/{self.inbound_id}")
+            api.inbound._post(url, XUI_JSON_HEADERS, data)
+
+        self.session.call(write)
+
+    def _build_client(self, subscription: Subscription, enable: bool) -> Client:
+        return Client(
+            id=str(subscription.vless_uuid),
+            email=str(subscription.user.telegram_id),
+            enable=enable,
+            inbound_id=self.inbound_id,
+        )
+
+    def create_clients(self, subscriptions: list[Subscription]) -> bool:
+        if not subscriptions:
+            return True
+
+        try:
+            new_clients = [
+                self._build_client(sub, enable=True) for sub in subscriptions
+            ]
+            with self._inbound_lock():
+                self.session.call(
+                    lambda api: api.client.add(self.inbound_id, new_clients)
+                )
+
+            logger.info(f"Created {len(new_clients)} new VPN clients")
             return True
         except Exception as e:
             logger.error(
-                f"[VpnService] Failed to create client for user {subscription.user.telegram_id}: {e}"
+                f"[VpnService] Failed to create {len(subscriptions)} clients: {e}"
             )
             return False
 
-    def disable_client(self, subscription: Subscription) -> bool:
-        if not self.api:
-            logger.error("[VpnService] API is not initialized")
-            return False
+    def set_clients_enabled(
+        self, subscriptions: list[Subscription], enable: bool
+    ) -> list[int]:
+        if not subscriptions:
+            return []
 
+        pending = {str(sub.vless_uuid): sub for sub in subscriptions}
+        done_ids = []
         try:
-            email = str(subscription.user.telegram_id)
-            client_uuid = str(subscription.vless_uuid)
-
-            client_to_update = self.api.client.get_by_email(email)
-            client_to_update.id = client_uuid
-            client_to_update.enable = False
-
-            self.api.client.update(client_uuid, client_to_update)
+            with self._inbound_lock():
+                inbound, inbound_settings = self._read_inbound()
+                changed = 0
+                for client in inbound_settings.get("clients", []):
+                    sub = pending.pop(client.get("id"), None)
+                    if sub is None:
+                        continue
+                    done_ids.append(sub.id)
+                    if client.get("enable", True) != enable:
+                        client["enable"] = enable
+                        changed += 1
 
-            logger.info(f"Disabled VPN client for user {email}")
-            return True
+                if changed:
+                    self._write_inbound(inbound, inbound_settings)
+            logger.info(
+                f"{'Enabled' if enable else 'Disabled'} {changed} VPN clients in one inbound update"
+            )
         except Exception as e:
             logger.error(
-                f"[VpnService] Failed to disable client for user {subscription.user.telegram_id}: {e}"
+                f"[VpnService] Failed to update {len(subscriptions)} clients: {e}"
             )
-            return False
+            return []
 
-    def ensure_client_is_active(self, subscription: Subscription) -> bool:
-        if not self.api:
-            logger.error("[VpnService] API is not initialized")
-            return False
+        missing = list(pending.values())
+        if not enable:
+            done_ids.extend(sub.id for sub in missing)
+        elif missing and self.create_clients(missing):
+            done_ids.extend(sub.id for sub in missing)
+        return done_ids
 
-        try:
-            email = str(subscription.user.telegram_id)
-            client_uuid = str(subscription.vless_uuid)
+    def reconcile_clients(
+        self, desired_states: Iterable[tuple[str, int, bool]]
+    ) -> tuple[dict[str, int], list[str]]:
+        drift = {"created": 0, "enabled": 0, "disabled": 0, "orphaned": 0}
+        enabled_uuids = []
+        batch_size = settings.VPN_RECONCILE_BATCH_SIZE
+        with self._inbound_lock(timeout=settings.VPN_RECONCILE_LOCK_TIMEOUT_SECONDS):
+            inbound, inbound_settings = self._read_inbound()
+            clients = {
+                client.get("id"): client
+                for client in inbound_settings.get("clients", [])
+            }
 
-            client_to_update = self.api.client.get_by_email(email)
-            client_to_update.id = client_uuid
-            client_to_update.enable = True
+            missing = []
+            for vless_uuid, telegram_id, enable in desired_states:
+                client = clients.pop(vless_uuid, None)
+                if client is None:
+                    if enable:
+                        missing.append(
+                            Client(
+                                id=vless_uuid,
+                                email=str(telegram_id),
+                                enable=True,
+                                inbound_id=self.inbound_id,
+                            )
+                        )
+                    continue
+                if client.get("enable", True) != enable:
+                    client["enable"] = enable
+                    drift["enabled" if enable else "disabled"] += 1
+                    if enable:
+                        enabled_uuids.append(vless_uuid)
+            drift["orphaned"] = len(clients)
 
-            self.api.client.update(client_uuid, client_to_update)
+            if drift["enabled"] or drift["disabled"]:
+                self._write_inbound(inbound, inbound_settings)
+            for i in range(0, len(missing), batch_size):
+                batch = missing[i : i + batch_size]
+                self.session.call(lambda api: api.client.add(self.inbound_id, batch))
+                drift["created"] += len(batch)
+                enabled_uuids.extend(client.id for client in batch)
 
-            logger.info(f"Re-enabled existing VPN client for user {email}")
-            return True
-        except Exception:
-            logger.info(f"VPN client for user {email} not found. Creating a new one.")
-            return self.create_client(subscription)
+        logger.info(f"[VpnService] Reconciled inbound {self.inbound_id}: {drift}")
+        return drift, enabled_uuids
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from backend.content.cache import TARIFFS, VPN_SERVERS, publish_content_change
+
+from .models import Tariff, VpnServer
+
+
+@receiver([post_save, post_delete], sender=Tariff)
+def tariff_changed(**kwargs):
+    publish_content_change(TARIFFS)
+
+
+@receiver([post_save, post_delete], sender=VpnServer)
+def vpn_server_changed(**kwargs):
+    publish_content_change(VPN_SERVERS)
@@ -1,27 +1,208 @@
+import logging
+
 from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import LockError
+
+from backend.vpn.models import Subscription, VpnServer
+from backend.vpn.placement import assign_servers
+from backend.vpn.services import VpnService, get_xui_session_metrics
+
+logger = logging.getLogger(__name__)
 
-from backend.vpn.models import Subscription
-from backend.vpn.services import VpnService
+PENDING_CLIENT_STATES_KEY = "vpn:pending_client_states"
+FLUSH_SCHEDULED_KEY = "vpn:pending_client_states:flush_scheduled"
+FLUSH_LOCK_KEY = "vpn:pending_client_states:flush_lock"
 
 
 @shared_task
 def ensure_vpn_client_active_task(subscription_id: int):
-    try:
-        subscription = Subscription.objects.get(id=subscription_id)
-        service = VpnService()
-        success = service.ensure_client_is_active(subscription)
-        if success:
-            subscription.is_vpn_client_active = True
-            subscription.save(update_fields=["is_vpn_client_active"])
-    except Subscription.DoesNotExist:
-        pass
+    queue_vpn_client_state(subscription_id, enable=True)
 
 
 @shared_task
 def deactivate_vpn_client_task(subscription_id: int):
+    queue_vpn_client_state(subscription_id, enable=False)
+
+
+# Drops only the fields whose queued state is still the one that was applied,
+# so a state queued while the flush was talking to the panel survives.
+REMOVE_APPLIED_STATES_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+"""
+
+
+def set_vpn_clients_enabled(subscription_ids: list[int], enable: bool) -> list[int]:
+    if enable:
+        assign_servers(subscription_ids)
+
+    subscriptions = list(
+        Subscription.objects.select_related("user", "server").filter(
+            id__in=subscription_ids
+        )
+    )
+    found_ids = {subscription.id for subscription in subscriptions}
+    done_ids = [sub_id for sub_id in subscription_ids if sub_id not in found_ids]
+    if not subscriptions:
+        return done_ids
+
+    subscriptions_by_server: dict[int | None, list[Subscription]] = {}
+    for subscription in subscriptions:
+        subscriptions_by_server.setdefault(subscription.server_id, []).append(
+            subscription
+        )
+
+    has_servers = VpnServer.objects.exists()
+    updated_ids = []
+    for server_id, server_subscriptions in subscriptions_by_server.items():
+        if server_id is None and has_servers:
+            if not enable:
+                updated_ids.extend(sub.id for sub in server_subscriptions)
+            continue
+        service = VpnService(server_subscriptions[0].server)
+        updated_ids.extend(service.set_clients_enabled(server_subscriptions, enable))
+
+    if enable and updated_ids:
+        Subscription.objects.filter(id__in=updated_ids).update(
+            is_vpn_client_active=True
+        )
+
+    logger.info(
+        f"Batch {'activation' if enable else 'deactivation'}: {len(updated_ids)} of {len(subscriptions)} VPN clients updated"
+    )
+    return done_ids + updated_ids
+
+
+@shared_task
+def set_vpn_clients_enabled_task(subscription_ids: list[int], enable: bool):
+    return len(set_vpn_clients_enabled(subscription_ids, enable))
+
+
+def schedule_vpn_client_flush(redis, countdown: int):
+    if redis.set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=max(countdown, 1) * 10):
+        flush_vpn_client_states_task.apply_async(countdown=countdown)
+
+
+def queue_vpn_client_states(subscription_ids: list[int], enable: bool):
+    if not subscription_ids:
+        return
+
+    redis = get_redis_connection("default")
+    redis.hset(
+        PENDING_CLIENT_STATES_KEY,
+        mapping={subscription_id: int(enable) for subscription_id in subscription_ids},
+    )
+    schedule_vpn_client_flush(redis, settings.VPN_BATCH_WINDOW_SECONDS)
+
+
+def queue_vpn_client_state(subscription_id: int, enable: bool):
+    queue_vpn_client_states([subscription_id], enable)
+
+
+def _apply_client_states(subscription_ids: list[int], enable: bool) -> list[int]:
+    if not subscription_ids:
+        return []
     try:
-        subscription = Subscription.objects.get(id=subscription_id)
-        service = VpnService()
-        service.disable_client(subscription=subscription)
-    except Subscription.DoesNotExist:
-        pass
+        return set_vpn_clients_enabled(subscription_ids, enable)
+    except Exception as e:
+        logger.error(
+            f"Failed to {'enable' if enable else 'disable'} {len(subscription_ids)} VPN clients: {e}"
+        )
+        return []
+
+
+@shared_task
+def flush_vpn_client_states_task():
+    redis = get_redis_connection("default")
+    redis.delete(FLUSH_SCHEDULED_KEY)
+    lock = redis.lock(
+        FLUSH_LOCK_KEY, timeout=settings.XUI_INBOUND_LOCK_TIMEOUT_SECONDS * 5
+    )
+    if not lock.acquire(blocking=False):
+        schedule_vpn_client_flush(redis, settings.VPN_BATCH_WINDOW_SECONDS)
+        return
+
+    try:
+        pending = redis.hgetall(PENDING_CLIENT_STATES_KEY)
+        if not pending:
+            return
+
+        to_enable = [int(sub_id) for sub_id, state in pending.items() if int(state)]
+        to_disable = [
+            int(sub_id) for sub_id, state in pending.items() if not int(state)
+        ]
+
+        applied = []
+        for sub_id in _apply_client_states(to_enable, enable=True):
+            applied.extend((sub_id, 1))
+        for sub_id in _apply_client_states(to_disable, enable=False):
+            applied.extend((sub_id, 0))
+        if applied:
+            redis.eval(
+                REMOVE_APPLIED_STATES_SCRIPT, 1, PENDING_CLIENT_STATES_KEY, *applied
+            )
+
+        failed = len(pending) - len(applied) // 2
+        if failed:
+            logger.warning(
+                f"{failed} VPN client states were not applied, retrying in {settings.VPN_FLUSH_RETRY_SECONDS}s"
+            )
+            schedule_vpn_client_flush(redis, settings.VPN_FLUSH_RETRY_SECONDS)
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            logger.warning("VPN client state flush lock expired before release")
+
+
+def _iter_desired_client_states(server: VpnServer | None, now):
+    subscriptions = (
+        Subscription.objects.filter(server=server)
+        .values_list("vless_uuid", "user_id", "end_date")
+        .iterator(chunk_size=settings.VPN_RECONCILE_BATCH_SIZE)
+    )
+    for vless_uuid, telegram_id, end_date in subscriptions:
+        yield str(vless_uuid), telegram_id, end_date > now
+
+
+@shared_task
+def reconcile_vpn_clients_task():
+    servers = list(VpnServer.objects.all()) or [None]
+    report = {}
+    for server in servers:
+        name = server.name if server else "default"
+        now = timezone.now()
+        try:
+            drift, enabled_uuids = VpnService(server).reconcile_clients(
+                _iter_desired_client_states(server, now)
+            )
+        except Exception as e:
+            logger.error(f"VPN reconciliation failed for {name}: {e}")
+            continue
+
+        # Expired subscriptions keep their flag: the expiry sweep owns that
+        # transition together with the user message and snapshot invalidation.
+        batch_size = settings.VPN_RECONCILE_BATCH_SIZE
+        drift["flags_enabled"] = 0
+        for i in range(0, len(enabled_uuids), batch_size):
+            drift["flags_enabled"] += Subscription.objects.filter(
+                vless_uuid__in=enabled_uuids[i : i + batch_size],
+                is_vpn_client_active=False,
+            ).update(is_vpn_client_active=True)
+        report[name] = drift
+
+    logger.info(f"VPN reconciliation drift: {report}")
+    return report
+
+
+@shared_task
+def log_xui_session_metrics_task():
+    metrics = get_xui_session_metrics()
+    logger.info(f"3x-ui session metrics: {metrics}")
+    return metrics
@@ -1,10 +1,9 @@
 from aiogram import F, Router
 from aiogram.enums import ParseMode
 from aiogram.types import CallbackQuery
-from django.conf import settings
 from django.utils import timezone
 
-from backend.vpn.models import Subscription
+from backend.users.cache import SubscriptionSnapshot
 from bot.keyboards.callbacks import ConnectCallback, MenuCallback
 from bot.keyboards.inline_keyboards import (
     get_connection_details_kb,
@@ -14,14 +13,14 @@ from bot.keyboards.inline_keyboards import (
 from bot.utils.db import (
     activate_trial_subscription,
     get_bot_texts,
+    get_vless_link_params,
 )
 
 router = Router()
 
 
-def get_vless_link(subscription: Subscription) -> str:
-    params = settings.VLESS_LINK_PARAMS
-    user_id = subscription.user.telegram_id
+def get_vless_link(subscription: SubscriptionSnapshot, params: dict) -> str:
+    user_id = subscription.telegram_id
     uuid = subscription.vless_uuid
 
     return (
@@ -41,12 +40,12 @@ async def select_device_handler(callback: CallbackQuery):
 
 async def show_connection_details(
     callback: CallbackQuery,
-    subscription: Subscription,
+    subscription: SubscriptionSnapshot,
     device: str,
     show_key: bool,
     show_instruction: bool,
 ):
-    vless_link = get_vless_link(subscription)
+    vless_link = get_vless_link(subscription, await get_vless_link_params(subscription))
     texts = await get_bot_texts()
 
     device_instructions = {
@@ -75,7 +74,9 @@ async def show_connection_details(
 
 @router.callback_query(ConnectCallback.filter())
 async def connection_actions_handler(
-    callback: CallbackQuery, callback_data: ConnectCallback, subscription: Subscription
+    callback: CallbackQuery,
+    callback_data: ConnectCallback,
+    subscription: SubscriptionSnapshot,
 ):
     if subscription.trial_activated and subscription.end_date <= timezone.now():
         texts = await get_bot_texts()
@@ -1,21 +1,21 @@
 import urllib.parse
 
-from aiogram import Bot, F, Router
+from aiogram import F, Router
 from aiogram.types import CallbackQuery
 
 from bot.keyboards.callbacks import MenuCallback
 from bot.keyboards.inline_keyboards import get_earn_kb
 from bot.utils.db import get_bot_texts
+from bot.utils.identity import BotIdentity
 
 router = Router()
 
 
 @router.callback_query(MenuCallback.filter(F.action == "earn"))
-async def earn_handler(callback: CallbackQuery, bot: Bot):
-    bot_info = await bot.get_me()
+async def earn_handler(callback: CallbackQuery, bot_identity: BotIdentity):
     user_id = callback.from_user.id
 
-    raw_referral_link = f"https://t.me/{bot_info.username}?start={user_id}"
+    raw_referral_link = f"https://t.me/{bot_identity.username}?start={user_id}"
 
     encoded_link = urllib.parse.quote(raw_referral_link, safe="")
     share_url = f"https://t.me/share/url?url={encoded_link}"
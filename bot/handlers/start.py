@@ -5,6 +5,7 @@ from aiogram.filters import CommandStart
 from aiogram.types import Message
 
 from bot.utils.db import get_or_create_user
+from bot.utils.identity import BotIdentity
 
 from .menu import show_main_menu
 
@@ -12,7 +13,7 @@ router = Router()
 
 
 @router.message(CommandStart())
-async def start_handler(message: Message, bot):
+async def start_handler(message: Message, bot_identity: BotIdentity):
     referrer_id = None
     match = re.search(r"/start (\d+)", message.text)
     if match:
@@ -24,4 +25,4 @@ async def start_handler(message: Message, bot):
         referred_by_id=referrer_id,
     )
 
-    await show_main_menu(message, user, user.subscription, bot)
+    await show_main_menu(message, user, user.subscription, bot_identity)
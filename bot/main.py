@@ -15,6 +15,10 @@ from django.conf import settings
 
 from bot.handlers import setup_handlers
 from bot.middlewares import setup_middlewares
+from bot.utils.cache import listen_for_invalidations
+from bot.utils.db import warm_content_cache
+from bot.utils.identity import BotIdentity
+from bot.utils.payments import yookassa_client
 
 
 async def main():
@@ -22,13 +26,22 @@ async def main():
     storage = RedisStorage.from_url(
         f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB_FSM}"
     )
-    dp = Dispatcher(storage=storage)
+    bot_identity = BotIdentity()
+    dp = Dispatcher(storage=storage, bot_identity=bot_identity)
 
     setup_middlewares(dp)
     setup_handlers(dp)
-
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    dp.startup.register(bot_identity.refresh)
+    dp.shutdown.register(yookassa_client.close)
+
+    invalidation_listener = asyncio.create_task(listen_for_invalidations())
+    try:
+        await warm_content_cache()
+        await bot.delete_webhook(drop_pending_updates=True)
+        await dp.start_polling(bot)
+    finally:
+        invalidation_listener.cancel()
+        await asyncio.gather(invalidation_listener, return_exceptions=True)
 
 
 if __name__ == "__main__":
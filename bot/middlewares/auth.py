@@ -3,7 +3,7 @@ from typing import Any, Awaitable, Callable, Dict
 from aiogram import BaseMiddleware
 from aiogram.types import CallbackQuery, Message
 
-from bot.utils.db import get_user_with_subscription
+from bot.utils.cache import get_user_snapshot
 
 
 class AuthMiddleware(BaseMiddleware):
@@ -13,7 +13,7 @@ class AuthMiddleware(BaseMiddleware):
         event: Message | CallbackQuery,
         data: Dict[str, Any],
     ) -> Any:
-        user = await get_user_with_subscription(event.from_user.id)
+        user = await get_user_snapshot(event.from_user.id)
 
         if user:
             data["user"] = user
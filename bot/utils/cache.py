@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from django.conf import settings
+from redis.asyncio import Redis
+
+from backend.content.cache import CONTENT_INVALIDATION_CHANNEL
+from backend.users.cache import (
+    SNAPSHOT_INVALIDATION_CHANNEL,
+    UserSnapshot,
+    load_user_snapshot,
+)
+from bot.utils.executor import run_in_db_executor
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def discard(self, key: Hashable):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+
+user_snapshots = LRUCache(
+    settings.USER_SNAPSHOT_LOCAL_MAX_SIZE, settings.USER_SNAPSHOT_LOCAL_TTL_SECONDS
+)
+user_snapshot_generation = 0
+
+
+async def get_user_snapshot(telegram_id: int) -> UserSnapshot | None:
+    snapshot = user_snapshots.get(telegram_id)
+    if snapshot is None:
+        generation = user_snapshot_generation
+        snapshot = await run_in_db_executor(load_user_snapshot)(telegram_id)
+        if snapshot is not None and generation == user_snapshot_generation:
+            user_snapshots.set(telegram_id, snapshot)
+    return snapshot
+
+
+def forget_user_snapshot(telegram_id: int):
+    user_snapshots.discard(telegram_id)
+
+
+class ContentCache:
+    def __init__(self):
+        self.values: dict[str, Any] = {}
+        self.generations: dict[str, int] = {}
+
+    async def get(self, name: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        if name in self.values:
+            return self.values[name]
+
+        generation = self.generations.get(name, 0)
+        value = await loader()
+        if self.generations.get(name, 0) == generation:
+            self.values[name] = value
+        return value
+
+    def invalidate(self, name: str):
+        self.generations[name] = self.generations.get(name, 0) + 1
+        self.values.pop(name, None)
+
+    def clear(self):
+        for name in list(self.values):
+            self.invalidate(name)
+
+
+content_cache = ContentCache()
+
+
+def _handle_invalidation(channel: bytes, data: bytes):
+    global user_snapshot_generation
+
+    if channel == CONTENT_INVALIDATION_CHANNEL.encode():
+        content_cache.invalidate(data.decode())
+        logger.info(f"Кэш {data.decode()} сброшен")
+    else:
+        user_snapshot_generation += 1
+        for telegram_id in data.split(b","):
+            user_snapshots.discard(int(telegram_id))
+
+
+async def listen_for_invalidations():
+    global user_snapshot_generation
+
+    redis = Redis.from_url(settings.CACHES["default"]["LOCATION"])
+    try:
+        while True:
+            try:
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(
+                        SNAPSHOT_INVALIDATION_CHANNEL, CONTENT_INVALIDATION_CHANNEL
+                    )
+                    user_snapshot_generation += 1
+                    user_snapshots.clear()
+                    content_cache.clear()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            _handle_invalidation(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка подписки на инвалидацию кэша: {e}")
+                await asyncio.sleep(1)
+    finally:
+        await redis.aclose()
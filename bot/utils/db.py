@@ -1,109 +1,206 @@
+import asyncio
+import uuid
+from enum import Enum
 from typing import Tuple
 
-from asgiref.sync import sync_to_async
-from django.db import transaction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
 from django.utils import timezone
 
+from backend.content.cache import BOT_TEXTS, SITE_SETTINGS, TARIFFS, VPN_SERVERS
 from backend.content.models import BotTexts, SiteSettings
+from backend.outbox.models import OutboxEvent
+from backend.outbox.services import publish_outbox_event
 from backend.payments.models import Payment as PaymentModel
-from backend.referrals.tasks import process_referral_bonus_for_payment
+from backend.payments.services import (
+    get_open_payment,
+    remember_open_payment,
+    settle_payment,
+)
 from backend.sender.models import Broadcast
+from backend.users.cache import (
+    SubscriptionSnapshot,
+    UserSnapshot,
+    invalidate_user_snapshots_on_commit,
+    load_user_snapshot,
+)
 from backend.users.models import User
-from backend.vpn.models import Subscription, Tariff
-from backend.vpn.tasks import ensure_vpn_client_active_task
+from backend.vpn.models import Subscription, Tariff, VpnServer
+from backend.vpn.placement import assign_servers
+from bot.utils.cache import content_cache
+from bot.utils.executor import run_in_db_executor
+from bot.utils.payments import check_yookassa_payment
+
+REGISTER_USER_SQL = """
+    WITH new_user AS (
+        INSERT INTO {user} (telegram_id, username, referred_by_id, date_joined)
+        VALUES (
+            %(telegram_id)s,
+            %(username)s,
+            (
+                SELECT telegram_id FROM {user}
+                WHERE telegram_id = %(referred_by_id)s
+                  AND telegram_id <> %(telegram_id)s
+            ),
+            %(now)s
+        )
+        ON CONFLICT (telegram_id) DO NOTHING
+        RETURNING telegram_id
+    ), new_subscription AS (
+        INSERT INTO {subscription}
+            (user_id, end_date, vless_uuid, trial_activated, total_paid,
+             is_vpn_client_active)
+        SELECT telegram_id, %(now)s, %(vless_uuid)s, FALSE, 0, FALSE
+        FROM new_user
+        ON CONFLICT (user_id) DO NOTHING
+    )
+    SELECT EXISTS (SELECT 1 FROM new_user)
+"""
 
 
-@sync_to_async
+@run_in_db_executor
 def get_or_create_user(
     telegram_id: int, username: str, referred_by_id: int = None
-) -> Tuple[User, bool]:
-    referrer = None
-    if referred_by_id:
-        try:
-            referrer = User.objects.get(telegram_id=referred_by_id)
-            if referrer.telegram_id == telegram_id:
-                referrer = None
-        except User.DoesNotExist:
-            referrer = None
-
-    with transaction.atomic():
-        user, created = User.objects.get_or_create(
-            telegram_id=telegram_id,
-            defaults={"username": username, "referred_by": referrer},
+) -> Tuple[UserSnapshot, bool]:
+    sql = REGISTER_USER_SQL.format(
+        user=User._meta.db_table, subscription=Subscription._meta.db_table
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql,
+            {
+                "telegram_id": telegram_id,
+                "username": username,
+                "referred_by_id": referred_by_id,
+                "now": timezone.now(),
+                "vless_uuid": uuid.uuid4(),
+            },
         )
-        if created:
-            Subscription.objects.create(user=user, end_date=timezone.now())
+        (created,) = cursor.fetchone()
 
-    user_with_subscription = User.objects.select_related("subscription").get(
-        telegram_id=telegram_id
-    )
-    return user_with_subscription, created
+    return load_user_snapshot(telegram_id), created
 
 
-@sync_to_async
-def get_user_with_subscription(telegram_id: int):
-    try:
-        return User.objects.select_related("subscription").get(telegram_id=telegram_id)
-    except User.DoesNotExist:
-        return None
+@run_in_db_executor
+def _load_active_tariffs():
+    return list(Tariff.objects.filter(is_active=True).order_by("order"))
 
 
-@sync_to_async
-def get_active_tariffs():
-    return list(Tariff.objects.filter(is_active=True).order_by("order"))
+async def get_active_tariffs():
+    return await content_cache.get(TARIFFS, _load_active_tariffs)
 
 
-@sync_to_async
-def get_tariff_by_id(tariff_id: int):
+@run_in_db_executor
+def _load_tariff(tariff_id: int):
     try:
         return Tariff.objects.get(id=tariff_id)
     except Tariff.DoesNotExist:
         return None
 
 
-@sync_to_async
+async def get_tariff_by_id(tariff_id: int):
+    for tariff in await get_active_tariffs():
+        if tariff.id == tariff_id:
+            return tariff
+    return await _load_tariff(tariff_id)
+
+
+@run_in_db_executor
+def get_open_payment_link(user: UserSnapshot, tariff: Tariff) -> Tuple[str, str] | None:
+    return get_open_payment(user.telegram_id, tariff.id, tariff.price)
+
+
+@run_in_db_executor
 def create_payment_record(
-    user: User, tariff: Tariff, payment_id_provider: str
+    user: UserSnapshot, tariff: Tariff, payment_id_provider: str, confirmation_url: str
 ) -> PaymentModel:
     payment = PaymentModel.objects.create(
-        user=user,
+        user_id=user.telegram_id,
         tariff=tariff,
         amount=tariff.price,
         payment_id_provider=payment_id_provider,
         status=PaymentModel.Status.PENDING,
     )
+    remember_open_payment(payment, confirmation_url)
     return payment
 
 
-@sync_to_async
-def get_pending_payment(payment_id_provider: str):
-    try:
-        return PaymentModel.objects.select_related("user", "tariff").get(
-            payment_id_provider=payment_id_provider, status=PaymentModel.Status.PENDING
-        )
-    except PaymentModel.DoesNotExist:
-        return None
+@run_in_db_executor
+def get_payment_status(payment_id_provider: str):
+    return (
+        PaymentModel.objects.filter(payment_id_provider=payment_id_provider)
+        .values_list("status", flat=True)
+        .first()
+    )
 
 
-@sync_to_async
-def process_successful_payment(payment: PaymentModel):
-    with transaction.atomic():
-        subscription = Subscription.objects.select_for_update().get(user=payment.user)
+@run_in_db_executor
+def process_successful_payment(payment_id_provider: str) -> bool:
+    return settle_payment(payment_id_provider, succeeded=True) is not None
 
-        subscription.extend_subscription(days=payment.tariff.duration_days)
-        subscription.total_paid += payment.amount
-        subscription.save(update_fields=["total_paid"])
 
-        payment.status = PaymentModel.Status.SUCCEEDED
-        payment.save()
+class PaymentConfirmation(Enum):
+    NOT_PAID = "not_paid"
+    CREDITED = "credited"
+    ALREADY_CREDITED = "already_credited"
 
-        if not subscription.is_vpn_client_active:
-            ensure_vpn_client_active_task.delay(subscription.id)
 
-    process_referral_bonus_for_payment.delay(payment.id)
+async def _confirm_payment(payment_id_provider: str) -> PaymentConfirmation:
+    status = await get_payment_status(payment_id_provider)
+    if status == PaymentModel.Status.PENDING and await check_yookassa_payment(
+        payment_id_provider
+    ):
+        if await process_successful_payment(payment_id_provider):
+            return PaymentConfirmation.CREDITED
+        status = await get_payment_status(payment_id_provider)
+    if status == PaymentModel.Status.SUCCEEDED:
+        return PaymentConfirmation.ALREADY_CREDITED
+    return PaymentConfirmation.NOT_PAID
 
 
-@sync_to_async
+def _shared_confirmation(result: PaymentConfirmation) -> PaymentConfirmation:
+    if result == PaymentConfirmation.CREDITED:
+        return PaymentConfirmation.ALREADY_CREDITED
+    return result
+
+
+async def confirm_payment(payment_id_provider: str) -> PaymentConfirmation:
+    lock_key = f"payments:confirm_lock:{payment_id_provider}"
+    result_key = f"payments:confirm_result:{payment_id_provider}"
+    lock_timeout = settings.PAYMENT_CONFIRM_LOCK_SECONDS
+
+    result = await cache.aget(result_key)
+    if result is not None:
+        return _shared_confirmation(result)
+
+    if await cache.aadd(lock_key, True, timeout=lock_timeout):
+        try:
+            result = await _confirm_payment(payment_id_provider)
+            await cache.aset(
+                result_key, result, timeout=settings.PAYMENT_CONFIRM_RESULT_SECONDS
+            )
+            return result
+        finally:
+            await cache.adelete(lock_key)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + lock_timeout
+    while loop.time() < deadline:
+        await asyncio.sleep(0.2)
+        result = await cache.aget(result_key)
+        if result is not None:
+            return _shared_confirmation(result)
+        if not await cache.ahas_key(lock_key):
+            break
+
+    status = await get_payment_status(payment_id_provider)
+    if status == PaymentModel.Status.SUCCEEDED:
+        return PaymentConfirmation.ALREADY_CREDITED
+    return PaymentConfirmation.NOT_PAID
+
+
+@run_in_db_executor
 @transaction.atomic
 def activate_trial_subscription(subscription_id: int) -> bool:
     try:
@@ -115,20 +212,26 @@ def activate_trial_subscription(subscription_id: int) -> bool:
 
         sub.trial_activated = True
         sub.save(update_fields=["trial_activated"])
+        invalidate_user_snapshots_on_commit([sub.user_id])
 
-        ensure_vpn_client_active_task.delay(sub.id)
+        publish_outbox_event(OutboxEvent.Kind.VPN_CLIENT_ACTIVATE, sub.id)
         return True
     except Subscription.DoesNotExist:
         return False
 
 
-@sync_to_async
-def get_support_link():
-    settings, _ = SiteSettings.objects.get_or_create(pk=1)
-    return settings.support_link
+@run_in_db_executor
+def _load_site_settings():
+    site_settings, _ = SiteSettings.objects.get_or_create(pk=1)
+    return site_settings
+
 
+async def get_support_link():
+    site_settings = await content_cache.get(SITE_SETTINGS, _load_site_settings)
+    return site_settings.support_link
 
-@sync_to_async
+
+@run_in_db_executor
 def update_broadcast_status_db(broadcast_id: int, status: str):
     try:
         Broadcast.objects.filter(pk=broadcast_id).update(status=status)
@@ -137,7 +240,34 @@ def update_broadcast_status_db(broadcast_id: int, status: str):
         return False
 
 
-@sync_to_async
-def get_bot_texts():
+@run_in_db_executor
+def _load_bot_texts():
     texts, _ = BotTexts.objects.get_or_create(pk=1)
     return texts
+
+
+async def get_bot_texts():
+    return await content_cache.get(BOT_TEXTS, _load_bot_texts)
+
+
+@run_in_db_executor
+def _load_vpn_servers():
+    return {server.id: server for server in VpnServer.objects.all()}
+
+
+async def get_vless_link_params(subscription: SubscriptionSnapshot) -> dict:
+    server_id = subscription.server_id
+    if server_id is None:
+        assignments = await run_in_db_executor(assign_servers)([subscription.id])
+        server_id = assignments.get(subscription.id)
+
+    servers = await content_cache.get(VPN_SERVERS, _load_vpn_servers)
+    server = servers.get(server_id)
+    return server.link_params if server else settings.VLESS_LINK_PARAMS
+
+
+async def warm_content_cache():
+    await get_bot_texts()
+    await get_support_link()
+    await get_active_tariffs()
+    await content_cache.get(VPN_SERVERS, _load_vpn_servers)
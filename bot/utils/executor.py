@@ -0,0 +1,23 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+db_executor = ThreadPoolExecutor(
+    max_workers=settings.BOT_DB_EXECUTOR_WORKERS, thread_name_prefix="bot-db"
+)
+
+
+def run_in_db_executor(func: Callable):
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False, executor=db_executor)
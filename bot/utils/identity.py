@@ -0,0 +1,22 @@
+from aiogram import Bot
+
+
+class BotIdentity:
+    __slots__ = ("id", "username", "full_name")
+
+    def __init__(
+        self,
+        id: int | None = None,
+        username: str | None = None,
+        full_name: str | None = None,
+    ):
+        self.id = id
+        self.username = username
+        self.full_name = full_name
+
+    async def refresh(self, bot: Bot) -> "BotIdentity":
+        me = await bot.get_me()
+        self.id = me.id
+        self.username = me.username
+        self.full_name = me.full_name
+        return self
@@ -1,11 +1,89 @@
+import asyncio
 import os
 import uuid
 from typing import Optional, Tuple
 
-from yookassa import Configuration, Payment
+import aiohttp
 
-Configuration.account_id = os.getenv("YOOKASSA_SHOP_ID")
-Configuration.secret_key = os.getenv("YOOKASSA_SECRET_KEY")
+YOOKASSA_API_URL = "https://api.yookassa.ru/v3"
+
+
+class YooKassaError(Exception):
+    def __init__(self, status: int, description: str):
+        super().__init__(f"{status}: {description}")
+        self.status = status
+
+
+class YooKassaClient:
+    def __init__(
+        self,
+        shop_id: str,
+        secret_key: str,
+        timeout: float = 10,
+        max_retries: int = 3,
+        max_connections: int = 20,
+    ):
+        self.auth = aiohttp.BasicAuth(shop_id or "", secret_key or "")
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_retries = max_retries
+        self.max_connections = max_connections
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                auth=self.auth,
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+            )
+        return self._session
+
+    async def _request(
+        self, method: str, path: str, json: dict | None = None, headers=None
+    ) -> dict:
+        session = self._get_session()
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                async with session.request(
+                    method, f"{YOOKASSA_API_URL}/{path}", json=json, headers=headers
+                ) as response:
+                    if response.status >= 500 or response.status == 429:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info,
+                            response.history,
+                            status=response.status,
+                        )
+                    data = await response.json()
+                    if response.status >= 400:
+                        raise YooKassaError(
+                            response.status, data.get("description", str(data))
+                        )
+                    return data
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+
+    async def create_payment(self, payload: dict, idempotence_key: str) -> dict:
+        return await self._request(
+            "POST",
+            "payments",
+            json=payload,
+            headers={"Idempotence-Key": idempotence_key},
+        )
+
+    async def get_payment(self, payment_id: str) -> dict:
+        return await self._request("GET", f"payments/{payment_id}")
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+yookassa_client = YooKassaClient(
+    shop_id=os.getenv("YOOKASSA_SHOP_ID"),
+    secret_key=os.getenv("YOOKASSA_SECRET_KEY"),
+)
 
 
 async def create_yookassa_payment(
@@ -28,7 +106,7 @@ async def create_yookassa_payment(
             "tax_system": 1,
         }
 
-        payment = Payment.create(
+        payment = await yookassa_client.create_payment(
             {
                 "amount": {"value": str(amount), "currency": "RUB"},
                 "confirmation": {"type": "redirect", "return_url": return_url},
@@ -38,7 +116,7 @@ async def create_yookassa_payment(
             },
             idempotence_key,
         )
-        return payment.confirmation.confirmation_url, payment.id
+        return payment["confirmation"]["confirmation_url"], payment["id"]
     except Exception as e:
         print(f"Ошибка создания платежа в ЮKassa: {e}")
         return None
@@ -46,8 +124,8 @@ async def create_yookassa_payment(
 
 async def check_yookassa_payment(payment_id: str) -> bool:
     try:
-        payment = Payment.find_one(payment_id)
-        return payment.status == "succeeded"
+        payment = await yookassa_client.get_payment(payment_id)
+        return payment["status"] == "succeeded"
     except Exception as e:
         print(f"Ошибка проверки платежа {payment_id} в ЮKassa: {e}")
         return False